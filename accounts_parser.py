@@ -1,7 +1,13 @@
+import os
 import typing
 import numpy as np
 import pandas as pd
+import threading
+from collections import OrderedDict
 from enum import Enum
+from csv_engine import AUTO, infer_column_types, read_csv_array, read_csv_frame
+from asset_query import ACCOUNTS, ASSETS, JOINED_ACCOUNT_PREFIX, Query, compile_mask
+from sharded_output import EXCEL_MAX_ROWS, is_manifest, read_manifest, write_shards
 
 """
 This script will look through the assets csv and account csv files.
@@ -27,46 +33,114 @@ class AccountTypes(Enum):
     VC_VCV = "VC-VCV"
 
 
+# Derived columns the declarative queries can use on the assets besides the CSV columns
+DISTRIBUTOR_COLUMN = 'Distributor'
+WARRANTY_EXPIRATION_COLUMN = 'Warranty_Expiration'
+# Maximum number of query results kept by AccountsAndAssets.query
+QUERY_CACHE_SIZE = 128
+
+
 def _index_find(name: str, arr: np.ndarray) -> int:
     return np.where(arr[0] == name)[0][0]
 
 
-class AccountsAndAssets:
+def _parse_dates(values: np.ndarray) -> np.ndarray:
     """
-    Contains the account csv file information and can retrieve information in different formats.
+    Parses a column of Salesforce dates (M/D/YYYY strings) in one vectorized call.
+    :param values: the column values, empty strings for missing dates
+    :return: a datetime64[D] array with NaT where the date is missing or malformed
     """
+    dates = pd.to_datetime(pd.Series(values, dtype=object), format='%m/%d/%Y', errors='coerce')
+    return dates.to_numpy().astype('datetime64[D]')
 
-    def __init__(self, accounts_file_name: str, assets_file_name: str):
-        """
-        Constructor for the class that requires queried CSV files from Dataloader.io
-        :param accounts_file_name: the account CSV file query name as a string
-        :param assets_file_name: the assets CSV file query name as a string
-        """
-        try:
-            self._accounts_arr = np.genfromtxt(accounts_file_name, delimiter=',', dtype=str)
-        except IOError:
-            raise Exception("Accounts file not found.")
 
-        if len(self._accounts_arr) < 2:
-            raise Exception("Accounts file is empty")
+def _query_values(values: np.ndarray) -> np.ndarray:
+    """
+    Converts a column for the declarative queries: numeric columns to floats so they compare as numbers, anything
+    else to strings.
+    :param values: the column values, empty strings for missing values
+    :return: a float array with NaN for the missing values, or a string array
+    """
+    present = values[values != '']
+    if len(present) and pd.api.types.infer_dtype(present) in ('integer', 'floating', 'mixed-integer-float'):
+        return np.where(values == '', np.nan, values).astype(float)
 
-        assets_df = pd.read_csv(assets_file_name)
-        assets_header = assets_df.columns.tolist()
-        try:
-            self._assets_arr = assets_df.fillna('').to_numpy()
-            self._assets_arr = np.vstack((assets_header, self._assets_arr))
+    return values.astype(str)
 
-        except IOError:
-            raise Exception("Assets file not found.")
 
-        if len(self._assets_arr) < 2:
-            raise Exception("Assets file is empty.")
+def _to_day(value) -> np.datetime64:
+    """
+    Converts a date given as a string (M/D/YYYY or ISO), datetime.date or numpy datetime64 to a datetime64[D].
+    :param value: the date to convert
+    :return: the date as a numpy datetime64 with day precision
+    """
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+def _read_accounts_arr(accounts_file_name: str, engine: str = AUTO) -> np.ndarray:
+    """
+    Reads the accounts CSV file from Dataloader.io.
+    :param accounts_file_name: the account CSV file query name as a string
+    :param engine: the CSV parse engine, one of csv_engine.CSV_ENGINES
+    :return: the accounts array with the header row on top, every value as a string
+    """
+    try:
+        accounts_arr = read_csv_array(accounts_file_name, engine, infer_types=False).astype(str)
+    except IOError:
+        raise Exception("Accounts file not found.")
+
+    if len(accounts_arr) < 2:
+        raise Exception("Accounts file is empty")
+
+    return accounts_arr
+
+
+def _read_assets_arr(assets_file_name: str, engine: str = AUTO) -> np.ndarray:
+    """
+    Reads the assets CSV file from Dataloader.io.
+    :param assets_file_name: the assets CSV file query name as a string
+    :param engine: the CSV parse engine, one of csv_engine.CSV_ENGINES
+    :return: the assets array with the header row on top
+    """
+    try:
+        assets_arr = read_csv_array(assets_file_name, engine)
+    except IOError:
+        raise Exception("Assets file not found.")
+
+    if len(assets_arr) < 2:
+        raise Exception("Assets file is empty.")
+
+    return assets_arr
+
+
+class AssetsSnapshot:
+    """
+    One immutable version of the accounts and assets information, with every index derived from it.
+    The arrays are read-only and nothing is replaced after construction, so any number of threads can read a snapshot
+    without locking. The caches filled lazily (query columns, query results and asset row hashes) are read and written
+    under one reentrant lock.
+    """
+
+    def __init__(self, accounts_arr: np.ndarray, assets_arr: np.ndarray, previous: 'AssetsSnapshot' = None):
+        """
+        Constructor for the AssetsSnapshot class. Builds every index before the snapshot is handed out.
+        :param accounts_arr: the accounts array with the header row on top
+        :param assets_arr: the assets array with the header row on top
+        :param previous: the snapshot this one replaces; its account indices are reused when the accounts array is
+        the same
+        """
+        self._accounts_arr = accounts_arr
+        self._assets_arr = assets_arr
 
-        # print("assets array: \n", self._assets_arr)
         # The indices for different cols of the accounts file
         self._accounts_category_index = _index_find('Category__c', self._accounts_arr)
         self._accounts_id_index = _index_find('Id', self._accounts_arr)
         self._accounts_partner_owner_index = _index_find('Partner_Owner__c', self._accounts_arr)
+        if previous is not None and previous._accounts_arr is accounts_arr:
+            self._accounts_id_order = previous._accounts_id_order
+            self._accounts_sorted_ids = previous._accounts_sorted_ids
+        else:
+            self._build_account_id_index()
 
         # The indices for different cols of the assets file
         self._asset_account_name = _index_find('Account.Name', self._assets_arr)
@@ -74,6 +148,113 @@ class AccountsAndAssets:
         self._asset_account_id = _index_find('AccountId', self._assets_arr)
         self._asset_id = _index_find('Id', self._assets_arr)
 
+        # Derived per-asset columns used by the vectorized queries
+        self._asset_distributor_ids = self._derive_asset_distributor_ids()
+        self._build_warranty_index()
+
+        for arr in (self._accounts_arr, self._assets_arr, self._accounts_id_order, self._accounts_sorted_ids,
+                    self._asset_distributor_ids, self._warranty_dates, self._extended_warranty_dates,
+                    self._warranty_expiration, self._warranty_order, self._warranty_sorted):
+            arr.flags.writeable = False
+
+        # Column arrays and results of the declarative queries
+        self._query_columns = {}
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.RLock()
+        self._row_hashes = None
+
+    def _asset_row_hashes(self) -> np.ndarray:
+        """
+        Hashes every asset row so two versions of the assets file can be compared without a Python loop.
+        The hashes are computed once per snapshot, so a reload only hashes the new assets file.
+        :return: a read-only uint64 array aligned with the assets array rows (header excluded)
+        """
+        with self._query_cache_lock:
+            if self._row_hashes is None:
+                row_hashes = pd.util.hash_pandas_object(pd.DataFrame(self._assets_arr[1:]).astype(str),
+                                                        index=False).to_numpy()
+                row_hashes.flags.writeable = False
+                self._row_hashes = row_hashes
+
+            return self._row_hashes
+
+    def _asset_distributor_memberships(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Gets every distributor the given assets are split to, with the same rule as get_all_assets_by_distributor:
+        the asset account is the distributor or one of its children, or the asset Account.Partner_Owner__c is the
+        distributor. A stale Account.Partner_Owner__c can place an asset under two distributors.
+        :param rows: boolean mask or indices of the asset rows (header excluded)
+        :return: a sorted array of the distributor ids
+        """
+        account_ids = self._assets_arr[1:, self._asset_account_id][rows].astype(str)
+        account_rows = self._lookup_account_rows(account_ids)
+        account_owners = np.where(account_rows > 0,
+                                  self._accounts_arr[account_rows, self._accounts_partner_owner_index], '')
+        candidates = np.concatenate((account_ids, account_owners.astype(str),
+                                     self._assets_arr[1:, self._asset_account_partner_owner][rows].astype(str)))
+        return np.intersect1d(candidates, self.get_accounts_by_type(AccountTypes.DISTRIBUTOR))
+
+    def _build_account_id_index(self):
+        """
+        Builds a sorted index over the account ids so account rows can be looked up for many ids at once.
+        :return: None
+        """
+        account_ids = self._accounts_arr[1:, self._accounts_id_index].astype(str)
+        self._accounts_id_order = np.argsort(account_ids, kind='stable')
+        self._accounts_sorted_ids = account_ids[self._accounts_id_order]
+
+    def _lookup_account_rows(self, account_ids: np.ndarray) -> np.ndarray:
+        """
+        Finds the accounts array row of every given account id.
+        :param account_ids: array of account ids to look up
+        :return: an int array with the row index in the accounts array (header is row 0), -1 for unknown ids
+        """
+        account_ids = np.asarray(account_ids).astype(str)
+        if len(self._accounts_sorted_ids) == 0:
+            return np.full(len(account_ids), -1)
+
+        positions = np.searchsorted(self._accounts_sorted_ids, account_ids)
+        positions = np.minimum(positions, len(self._accounts_sorted_ids) - 1)
+        found = self._accounts_sorted_ids[positions] == account_ids
+        return np.where(found, self._accounts_id_order[positions] + 1, -1)
+
+    def _derive_asset_distributor_ids(self) -> np.ndarray:
+        """
+        Works out which distributor every asset belongs to: the asset account itself when it is a distributor
+        (distributor inventory), otherwise the Account.Partner_Owner__c of the asset, otherwise the Partner_Owner__c
+        of the asset account in the accounts file.
+        :return: a string array with one distributor id per asset row (header excluded), empty when there is none
+        """
+        asset_account_ids = self._assets_arr[1:, self._asset_account_id].astype(str)
+        asset_partner_owners = self._assets_arr[1:, self._asset_account_partner_owner].astype(str)
+        distributor_ids = np.array(self.get_accounts_by_type(AccountTypes.DISTRIBUTOR), dtype=str)
+
+        account_rows = self._lookup_account_rows(asset_account_ids)
+        account_partner_owners = self._accounts_arr[:, self._accounts_partner_owner_index].astype(str)[account_rows]
+        account_partner_owners = np.where(account_rows > 0, account_partner_owners, '')
+
+        result = np.where(asset_partner_owners != '', asset_partner_owners, account_partner_owners)
+        return np.where(np.isin(asset_account_ids, distributor_ids), asset_account_ids, result)
+
+    def _build_warranty_index(self):
+        """
+        Parses the warranty columns into datetime64 arrays and sorts the assets by their warranty expiration.
+        The expiration of an asset is the later of its warranty and extended warranty dates.
+        :return: None
+        """
+        header = self._assets_arr[0].tolist()
+        missing = np.full(len(self._assets_arr) - 1, np.datetime64('NaT'), dtype='datetime64[D]')
+        columns = {}
+        for name in ('Warranty_Expiration_Date__c', 'Extended_Warranty_Expiration__c'):
+            columns[name] = _parse_dates(self._assets_arr[1:, header.index(name)]) if name in header else missing
+
+        self._warranty_dates = columns['Warranty_Expiration_Date__c']
+        self._extended_warranty_dates = columns['Extended_Warranty_Expiration__c']
+        self._warranty_expiration = np.fmax(self._warranty_dates, self._extended_warranty_dates)
+        # NaT sorts last, so the assets without a warranty date sit at the end of the index
+        self._warranty_order = np.argsort(self._warranty_expiration, kind='stable')
+        self._warranty_sorted = self._warranty_expiration[self._warranty_order]
+
     """
     Account file methods
     """
@@ -159,12 +340,204 @@ class AccountsAndAssets:
                                                                distributor_id)]
         return result
 
-    def split_assets_by_distributor(self) -> typing.Dict[str, np.ndarray]:
+    @property
+    def get_asset_distributor_arr(self) -> np.ndarray:
+        """
+        Gets the id of the distributor every asset belongs to.
+        :return: a string array aligned with the assets array rows (header excluded), empty when there is none
+        """
+        return self._asset_distributor_ids
+
+    @property
+    def get_warranty_expiration_arr(self) -> np.ndarray:
+        """
+        Gets the warranty expiration date of every asset, the later of the warranty and extended warranty dates.
+        :return: a datetime64[D] array aligned with the assets array rows (header excluded), NaT when unknown
+        """
+        return self._warranty_expiration
+
+    def _expiring_mask(self, start, end) -> np.ndarray:
+        """
+        Builds the mask of the assets whose warranty expires between two dates using the sorted warranty index.
+        :param start: first day of the window (inclusive)
+        :param end: last day of the window (inclusive)
+        :return: a boolean array aligned with the assets array rows (header excluded)
+        """
+        first = np.searchsorted(self._warranty_sorted, _to_day(start), side='left')
+        last = np.searchsorted(self._warranty_sorted, _to_day(end), side='right')
+        mask = np.zeros(len(self._warranty_expiration), dtype=bool)
+        mask[self._warranty_order[first:last]] = True
+        return mask
+
+    def get_assets_expiring_between(self, start, end, distributor_id: str = None) -> typing.List[typing.List[str]]:
+        """
+        Gets the assets whose warranty expires between two dates.
+        :param start: first day of the window (inclusive), as M/D/YYYY or ISO string, date or datetime64
+        :param end: last day of the window (inclusive), as M/D/YYYY or ISO string, date or datetime64
+        :param distributor_id: only return the assets that belong to this distributor, if given
+        :return: a list of asset rows
+        """
+        mask = self._expiring_mask(start, end)
+        if distributor_id is not None:
+            mask &= self._asset_distributor_ids == distributor_id
+
+        return self._assets_arr[1:][mask].tolist()
+
+    def get_expiring_assets_by_distributor(self, start, end) -> typing.Dict[str, np.ndarray]:
+        """
+        Groups the assets whose warranty expires between two dates by the distributor they belong to.
+        :param start: first day of the window (inclusive), as M/D/YYYY or ISO string, date or datetime64
+        :param end: last day of the window (inclusive), as M/D/YYYY or ISO string, date or datetime64
+        :return: a dictionary of distributor id -> assets array with the header row on top
+        """
+        mask = self._expiring_mask(start, end) & (self._asset_distributor_ids != '')
+        rows = self._assets_arr[1:][mask]
+        owners = self._asset_distributor_ids[mask]
+        return {distributor_id: np.vstack([self._assets_arr[0], rows[owners == distributor_id]])
+                for distributor_id in np.unique(owners).tolist()}
+
+    def get_expired_distributor_inventory(self, as_of=None, distributor_id: str = None) -> typing.List[typing.List[str]]:
+        """
+        Gets the assets whose warranty has expired while they are still in distributor inventory (the asset account is
+        the distributor account itself).
+        :param as_of: the day to compare the warranty expiration against, today if not given
+        :param distributor_id: only return the inventory of this distributor, if given
+        :return: a list of asset rows
+        """
+        as_of = np.datetime64('today', 'D') if as_of is None else _to_day(as_of)
+        asset_account_ids = self._assets_arr[1:, self._asset_account_id].astype(str)
+        # NaT compares False, so assets without a warranty date are never reported as expired
+        mask = (self._warranty_expiration < as_of) & (asset_account_ids == self._asset_distributor_ids)
+        mask &= self._asset_distributor_ids != ''
+        if distributor_id is not None:
+            mask &= self._asset_distributor_ids == distributor_id
+
+        return self._assets_arr[1:][mask].tolist()
+
+    def reconcile_rows(self, rows: np.ndarray,
+                       header: typing.List[str]) -> typing.Tuple[np.ndarray, typing.List[typing.List[str]]]:
+        """
+        Re-derives the denormalized Account.Name and Account.Partner_Owner__c columns of asset rows from the accounts
+        file, in one join on the account id index. Rows whose AccountId is not in the accounts file are left as is.
+        :param rows: the asset rows (header excluded), e.g. the assets array or the combined distributor files
+        :param header: the column names of the rows
+        :return: a copy of the rows with the columns re-derived, and a list of [asset id, column name, stale value,
+        derived value] for every value that disagreed
+        """
+        rows = np.array(rows, dtype=object).reshape(len(rows), len(header))
+        account_rows = self._lookup_account_rows(rows[:, header.index('AccountId')])
+        known = account_rows > 0
+        asset_ids = rows[:, header.index('Id')]
+
+        result = rows.copy()
+        mismatches = []
+        denormalized_columns = (('Account.Name', 'Name'), ('Account.Partner_Owner__c', 'Partner_Owner__c'))
+        for asset_column, account_column in denormalized_columns:
+            asset_index = header.index(asset_column)
+            derived = self._accounts_arr[:, _index_find(account_column, self._accounts_arr)][account_rows]
+            current = rows[:, asset_index].astype(str)
+            stale = known & (current != derived)
+            result[stale, asset_index] = derived[stale]
+            mismatches += [[asset_id, asset_column, old, new] for asset_id, old, new in
+                           zip(asset_ids[stale].tolist(), current[stale].tolist(), derived[stale].tolist())]
+
+        return result, mismatches
+
+    """
+    Query methods
+    """
+    def _get_query_column(self, table: str, name: str) -> np.ndarray:
+        """
+        Gets the values of a column for the declarative queries, converted once and kept until the next reload.
+        :param table: the table the column belongs to, ASSETS or ACCOUNTS
+        :param name: the column name; on the assets it can also be a derived column or a joined account column
+        :return: an array aligned with the rows of the table (header excluded)
+        """
+        with self._query_cache_lock:
+            key = (table, name)
+            if key not in self._query_columns:
+                column = self._build_query_column(table, name)
+                column.flags.writeable = False
+                self._query_columns[key] = column
+
+            return self._query_columns[key]
+
+    def _build_query_column(self, table: str, name: str) -> np.ndarray:
+        """
+        Converts a column for _get_query_column, which holds the query cache lock while calling it.
+        """
+        if table == ACCOUNTS:
+            header = self._accounts_arr[0].tolist()
+            if name not in header:
+                raise Exception("Unknown accounts column: " + name)
+            column = self._accounts_arr[1:, header.index(name)].astype(str)
+        elif name == DISTRIBUTOR_COLUMN:
+            column = self._asset_distributor_ids
+        elif name == WARRANTY_EXPIRATION_COLUMN:
+            column = self._warranty_expiration
+        elif name.startswith(JOINED_ACCOUNT_PREFIX):
+            if 'join' not in self._query_columns:
+                self._query_columns['join'] = self._lookup_account_rows(self._assets_arr[1:, self._asset_account_id])
+            account_rows = self._query_columns['join']
+            account_column = self._get_query_column(ACCOUNTS, name[len(JOINED_ACCOUNT_PREFIX):])
+            # assets whose account is not in the accounts file get empty account columns
+            column = np.where(account_rows > 0, account_column[account_rows - 1], '')
+        else:
+            header = self._assets_arr[0].tolist()
+            if name not in header:
+                raise Exception("Unknown assets column: " + name)
+            column = _query_values(self._assets_arr[1:, header.index(name)])
+
+        return column
+
+    def query(self, query: Query) -> np.ndarray:
+        """
+        Runs a declarative query (see asset_query.Query) as vectorized masks over the loaded arrays.
+        Results are kept in a least recently used cache until the data is reloaded, and are read-only.
+        :param query: the query to run
+        :return: the matching rows with the header row on top, restricted to the selected columns if any
+        """
+        with self._query_cache_lock:
+            if query in self._query_cache:
+                self._query_cache.move_to_end(query)
+                return self._query_cache[query]
+
+        referenced = [predicate[0] for predicate in query.predicates] + list(query.columns)
+        if not query.joined and any(name.startswith(JOINED_ACCOUNT_PREFIX) for name in referenced):
+            raise Exception("Query uses account columns without joining the accounts.")
+
+        table_arr = self._assets_arr if query.table == ASSETS else self._accounts_arr
+        mask = compile_mask(query, lambda name: self._get_query_column(query.table, name), len(table_arr) - 1)
+
+        if query.columns:
+            header = list(query.columns)
+            columns = [self._get_query_column(query.table, name)[mask].astype(object) for name in header]
+        else:
+            header = table_arr[0].tolist()
+            columns = [table_arr[1:, index][mask].astype(object) for index in range(len(header))]
+            if query.joined:
+                account_header = [JOINED_ACCOUNT_PREFIX + name for name in self._accounts_arr[0].tolist()]
+                columns += [self._get_query_column(ASSETS, name)[mask].astype(object) for name in account_header]
+                header += account_header
+
+        result = np.vstack([np.array(header, dtype=object), np.column_stack(columns)])
+        result.flags.writeable = False
+
+        with self._query_cache_lock:
+            self._query_cache[query] = result
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
+        return result
+
+    def split_assets_by_distributor(self, distributor_ids: typing.List[str] = None) -> typing.Dict[str, np.ndarray]:
         """
         Divides the all assets from all distributors file into
+        :param distributor_ids: only split the assets of these distributors, all distributors if not given
         :return:
         """
-        distributor_ids = self.get_accounts_by_type(AccountTypes.DISTRIBUTOR)
+        if distributor_ids is None:
+            distributor_ids = self.get_accounts_by_type(AccountTypes.DISTRIBUTOR)
         array_dict = {}
         for distributor_id in distributor_ids:
             new_file_arr = self.get_all_assets_by_distributor(distributor_id)
@@ -176,11 +549,149 @@ class AccountsAndAssets:
 
         return array_dict
 
-    def split_assets_and_save_csv(self):
-        file_dict = self.split_assets_by_distributor()
+    def split_assets_and_save_csv(self, distributor_ids: typing.List[str] = None) -> typing.Dict[str, np.ndarray]:
+        if distributor_ids is None:
+            distributor_ids = self.get_accounts_by_type(AccountTypes.DISTRIBUTOR)
+        file_dict = self.split_assets_by_distributor(distributor_ids)
         for key, value in file_dict.items():
             np.savetxt(key + '.csv', value, delimiter=',', fmt=('%s'))
 
+        # a distributor left without assets must not keep the file of its previous split
+        for distributor_id in distributor_ids:
+            if distributor_id not in file_dict and os.path.exists(distributor_id + '.csv'):
+                os.remove(distributor_id + '.csv')
+
+        return file_dict
+
+    def split_assets_and_save_shards(self, max_rows: int = EXCEL_MAX_ROWS, max_bytes: int = None,
+                                     distributor_ids: typing.List[str] = None,
+                                     directory: str = '') -> typing.Dict[str, str]:
+        """
+        Splits the assets by distributor like split_assets_and_save_csv, but writes every distributor as size-capped
+        parts with a manifest. The rows of every distributor are streamed to the parts, so besides the loaded assets
+        only one part is in memory at a time.
+        :param max_rows: the maximum number of data rows in a part
+        :param max_bytes: the maximum size in bytes of a part, no size cap if None
+        :param distributor_ids: only split the assets of these distributors, all distributors if not given
+        :param directory: the directory the parts are written to, the working directory by default
+        :return: a dictionary of distributor id -> manifest file name
+        """
+        if distributor_ids is None:
+            distributor_ids = self.get_accounts_by_type(AccountTypes.DISTRIBUTOR)
+
+        account_ids = self._assets_arr[1:, self._asset_account_id].astype(str)
+        partner_owners = self._assets_arr[1:, self._asset_account_partner_owner].astype(str)
+        manifests = {}
+        for distributor_id in distributor_ids:
+            # same membership as get_all_assets_by_distributor, as a mask so the rows can be streamed to the parts
+            children = self._accounts_arr[1:, self._accounts_id_index][
+                self._accounts_arr[1:, self._accounts_partner_owner_index] == distributor_id]
+            row_indices = np.flatnonzero(np.isin(account_ids, children.astype(str)) |
+                                         (partner_owners == distributor_id) | (account_ids == distributor_id))
+            if len(row_indices) > 0:
+                rows = (self._assets_arr[index + 1].tolist() for index in row_indices)
+                manifests[distributor_id] = write_shards(self._assets_arr[0].tolist(), rows,
+                                                         os.path.join(directory, distributor_id), max_rows, max_bytes)
+            else:
+                print('Distributor [', distributor_id, '] does not have any assets.')
+
+        return manifests
+
+
+class AccountsAndAssets:
+    """
+    Contains the account csv file information and can retrieve information in different formats.
+    The information is held in an immutable AssetsSnapshot. A reload builds the next snapshot while the current one
+    keeps serving readers, then swaps it in with a single assignment, so other threads never see a half loaded state.
+    Every AssetsSnapshot method can be called on this class and runs on the current snapshot; use get_snapshot to run
+    several queries against the same version of the data.
+    """
+
+    def __init__(self, accounts_file_name: str, assets_file_name: str, engine: str = AUTO):
+        """
+        Constructor for the class that requires queried CSV files from Dataloader.io
+        :param accounts_file_name: the account CSV file query name as a string
+        :param assets_file_name: the assets CSV file query name as a string
+        :param engine: the CSV parse engine used for every (re)load, one of csv_engine.CSV_ENGINES
+        """
+        self._accounts_file_name = accounts_file_name
+        self._assets_file_name = assets_file_name
+        self._engine = engine
+        self._reload_lock = threading.Lock()  # only serializes the reloads, readers never take it
+        self._snapshot = AssetsSnapshot(_read_accounts_arr(accounts_file_name, engine),
+                                        _read_assets_arr(assets_file_name, engine))
+
+    def __getattr__(self, name: str):
+        # Only called for the attributes not defined on this class: they are looked up on the current snapshot
+        if name == '_snapshot':
+            raise AttributeError(name)
+
+        return getattr(self._snapshot, name)
+
+    @property
+    def get_snapshot(self) -> AssetsSnapshot:
+        """
+        Gets the current snapshot. It never changes, even when the files are reloaded afterwards.
+        :return: the current AssetsSnapshot
+        """
+        return self._snapshot
+
+    @property
+    def get_accounts_file_name(self) -> str:
+        return self._accounts_file_name
+
+    @property
+    def get_assets_file_name(self) -> str:
+        return self._assets_file_name
+
+    def reload(self):
+        """
+        Reads the accounts and assets files again into a new snapshot (with an empty query cache) and swaps it in.
+        :return: None
+        """
+        with self._reload_lock:
+            snapshot = AssetsSnapshot(_read_accounts_arr(self._accounts_file_name, self._engine),
+                                      _read_assets_arr(self._assets_file_name, self._engine))
+            self._snapshot = snapshot
+
+    def reload_assets(self, assets_file_name: str = None) -> typing.List[str]:
+        """
+        Reads the whole assets file again into a new snapshot, keeping the accounts and their indices, and works out
+        which distributors have assets that were added, removed or changed, so only those are split again.
+        :param assets_file_name: the new assets CSV file name, the current one if not given
+        :return: a list of the ids of the distributors whose assets changed
+        """
+        with self._reload_lock:
+            if assets_file_name is not None:
+                self._assets_file_name = assets_file_name
+
+            old = self._snapshot
+            new = AssetsSnapshot(old._accounts_arr, _read_assets_arr(self._assets_file_name, self._engine), previous=old)
+            self._snapshot = new
+
+        old_hashes = old._asset_row_hashes()
+        new_hashes = new._asset_row_hashes()
+        affected = np.union1d(old._asset_distributor_memberships(~np.isin(old_hashes, new_hashes)),
+                              new._asset_distributor_memberships(~np.isin(new_hashes, old_hashes)))
+        return affected.tolist()
+
+    def reconcile_denormalized_columns(self) -> typing.List[typing.List[str]]:
+        """
+        Re-derives the Account.Name and Account.Partner_Owner__c columns of the assets from the accounts file, e.g.
+        after assets were moved to new accounts, and swaps in a snapshot with the corrected assets and their
+        distributor owners.
+        :return: a list of [asset id, column name, stale value, derived value] for every value that was corrected
+        """
+        with self._reload_lock:
+            old = self._snapshot
+            assets_header = old._assets_arr[0].tolist()
+            rows, mismatches = old.reconcile_rows(old._assets_arr[1:], assets_header)
+            if mismatches:
+                assets_arr = np.vstack((np.array(assets_header, dtype=object), rows))
+                self._snapshot = AssetsSnapshot(old._accounts_arr, assets_arr, previous=old)
+
+        return mismatches
+
 
 class CombinedFiles:
     """
@@ -189,7 +700,7 @@ class CombinedFiles:
     from different distributors and their corresponding ids.
     The dictionary entries can then be written to one file that is ready to upload to Salesforce.
     """
-    def __init__(self, accounts_file_name: str, original_all_assets_name: str):
+    def __init__(self, accounts_file_name: str, original_all_assets_name: str, engine: str = AUTO):
         """
         Constructor for CombinedFiles class.
         :param accounts_file_name: the original accounts file name (before splitting and sending to distributor)
@@ -197,10 +708,12 @@ class CombinedFiles:
         :param original_all_assets_name: the original assets file name (before splitting and sending to distributor)
         that contains information on all assets that are under a distributor (in their inventory) or under one of
         their child accounts.
+        :param engine: the CSV parse engine used for the original and the added files, one of csv_engine.CSV_ENGINES
         """
         self._files = {}  # files dictionary
+        self._engine = engine
         # AccountAndAssets private object to keep track and utilize the original files (compare, verify, etc.)
-        self._original_accounts_and_assets = AccountsAndAssets(accounts_file_name, original_all_assets_name)
+        self._original_accounts_and_assets = AccountsAndAssets(accounts_file_name, original_all_assets_name, engine)
         self.combined_arr = []
         self.changes =[]
         self.accountIdIndex = _index_find("AccountId", self._original_accounts_and_assets.get_assets_arr)
@@ -213,25 +726,49 @@ class CombinedFiles:
     def get_combined_list(self) -> typing.List[str]:
         return self.combined_arr
 
+    @property
+    def get_original_accounts_and_assets(self) -> AccountsAndAssets:
+        return self._original_accounts_and_assets
+
+    def reload(self):
+        """
+        Reads the original accounts and assets files again, e.g. after a new export, and combines and diffs the added
+        files against them again.
+        :return: None
+        """
+        self._original_accounts_and_assets.reload()
+        self.accountIdIndex = _index_find("AccountId", self._original_accounts_and_assets.get_assets_arr)
+        if self._files:
+            self.combine_files()
+            self.show_changes()
+
     def add_file(self, file_name: str):
         """
         Adds a new entry to the dictionary.
-        :param file_name: name of the file to look for and insert contents into dictionary.
+        :param file_name: name of the file to look for and insert contents into dictionary. A sharded output
+        manifest (see sharded_output.write_shards) is read as the concatenation of its parts.
         :return: None
         """
         try:
-            f_dataframe = pd.read_csv(file_name)
+            if is_manifest(file_name):
+                # the parts are read as text and the types are inferred once over all of them, so the values do not
+                # depend on how the rows were split into parts
+                manifest = read_manifest(file_name)
+                parts = [read_csv_frame(part['file'], self._engine, infer_types=False) for part in manifest['parts']]
+                f = [manifest['header']]
+                if parts:
+                    f_dataframe = infer_column_types(pd.concat(parts, ignore_index=True))
+                    f += f_dataframe.fillna('').to_numpy().tolist()
+            else:
+                f_dataframe = read_csv_frame(file_name, self._engine)
+                f = np.vstack((f_dataframe.columns.tolist(), f_dataframe.fillna('').to_numpy())).tolist()
         except IOError:
             raise Exception("Assets file not found.")
 
-        f_header = f_dataframe.columns.tolist()
-        f = f_dataframe.fillna('').to_numpy()
-        f = np.vstack((f_header, f))
-
         if len(f) < 2:
             raise Exception("Assets file is empty.")
 
-        self._files[file_name] = f.tolist()  # key -> file name; value -> file contents
+        self._files[file_name] = f  # key -> file name; value -> file contents
 
     def combine_files(self):
         """
@@ -277,11 +814,108 @@ class CombinedFiles:
 
         return count
 
-    def write_combined_file(self):
+    def _match_assets_by_id(self) -> typing.Tuple[typing.Dict, typing.Dict, typing.List[str], typing.List[str]]:
+        """
+        Matches the original and combined asset rows by Id.
+        :return: the original rows and the combined rows as dictionaries of asset id -> row, and the sorted ids of the
+        original assets missing from the combined files and of the combined assets missing from the original file
+        """
+        original_assets = self._original_accounts_and_assets.get_assets_arr
+        id_index = _index_find('Id', original_assets)
+        original_rows = {row[id_index]: row for row in original_assets[1:].tolist()}
+        combined_rows = {row[id_index]: row for row in self.combined_arr[1:]}
+        if len(combined_rows) != len(self.combined_arr[1:]):
+            raise Exception("The combined files hold the same asset more than once.")
+
+        missing = sorted(original_rows.keys() - combined_rows.keys())
+        added = sorted(combined_rows.keys() - original_rows.keys())
+        return original_rows, combined_rows, missing, added
+
+    def is_complete(self) -> bool:
+        """
+        Checks whether the combined files hold every asset of the original file, and no other asset, e.g. to know
+        whether every distributor has returned its file.
+        :return: True if the combined and original assets are the same
+        """
+        if not self.combined_arr:
+            return False
+
+        _, _, missing, added = self._match_assets_by_id()
+        return not missing and not added
+
+    def record_changes(self, history, run_timestamp=None) -> typing.Optional[int]:
+        """
+        Appends the changes between the original and the combined files to the change history as one combine run.
+        The original and combined rows are matched by asset Id, and the run is rejected when the returned files do not
+        hold exactly the assets of the original file, so a missing or extra row is never recorded as a sale.
+        :param history: the change_history.ChangeHistory to append to
+        :param run_timestamp: when the run happened, now if not given
+        :return: the id of the recorded run, None if there is nothing to record
+        """
+        if not self.combined_arr:
+            print("Empty combined array. Add files to combine.")
+            return None
+
+        original_rows, combined_rows, missing, added = self._match_assets_by_id()
+        if missing or added:
+            raise Exception("The combined files do not hold the assets of the original file (missing: {}, added: {}); "
+                            "run not recorded.".format(missing, added))
+
+        changes = [[row, combined_rows[asset_id]] for asset_id, row in original_rows.items()
+                   if row != combined_rows[asset_id]]
+        if not changes:
+            print("No changes made, run not recorded.")
+            return None
+
+        original_assets = self._original_accounts_and_assets.get_assets_arr
+        distributor_ids = dict(zip(original_rows.keys(),
+                                   self._original_accounts_and_assets.get_asset_distributor_arr.tolist()))
+        return history.record_run(original_assets[0].tolist(), changes, distributor_ids, run_timestamp,
+                                  source=', '.join(self._files.keys()))
+
+    def reconcile_combined(self) -> typing.List[typing.List[str]]:
+        """
+        Re-derives the Account.Name and Account.Partner_Owner__c columns of the combined array from the original
+        accounts file, so assets the distributors moved to another account carry that account's name and owner.
+        :return: a list of [asset id, column name, stale value, derived value] for every value that was corrected
+        """
+        if not self.combined_arr:
+            print("Empty combined array. Add files to combine.")
+            return []
+
+        header = list(self.combined_arr[0])
+        rows, mismatches = self._original_accounts_and_assets.get_snapshot.reconcile_rows(self.combined_arr[1:], header)
+        self.combined_arr = [header] + rows.tolist()
+        return mismatches
+
+    def write_combined_file(self, max_rows: int = None, max_bytes: int = None,
+                            base_file_name: str = 'combined_file') -> typing.Optional[str]:
+        """
+        Writes the combined array to combined_file.csv, or to size-capped parts when a cap is given.
+        :param max_rows: the maximum number of data rows in a part
+        :param max_bytes: the maximum size in bytes of a part
+        :param base_file_name: the path of the output without extension
+        :return: the manifest file name when the output is sharded, None otherwise
+        """
         if not self.combined_arr:
             print("Empty combined array. Add files to combine.")
             return
 
+        if max_rows is not None or max_bytes is not None:
+            return write_shards(self.combined_arr[0], iter(self.combined_arr[1:]), base_file_name,
+                                EXCEL_MAX_ROWS if max_rows is None else max_rows, max_bytes)
+
         df = pd.DataFrame(self.combined_arr)
-        df.to_csv('combined_file.csv', header=False, index=False)
+        df.to_csv(base_file_name + '.csv', header=False, index=False)
+
+    def upload_combined_file(self, uploader) -> typing.List:
+        """
+        Uploads the combined array in size-limited batches instead of writing one combined file.
+        :param uploader: the uploader.BatchUploader that splits the rows and sends them through its sink
+        :return: the list of uploader.BatchResult, one per batch
+        """
+        if not self.combined_arr:
+            print("Empty combined array. Add files to combine.")
+            return []
 
+        return uploader.upload(self.combined_arr)
@@ -0,0 +1,216 @@
+import typing
+import numpy as np
+import pandas as pd
+
+"""
+This script holds a small declarative query language for the assets and accounts arrays.
+A Query is built from column predicates, an optional join from the assets to their accounts and a projection.
+It is compiled into one vectorized boolean mask over the loaded columns instead of a Python loop over the rows.
+Queries are immutable and hashable so their results can be cached.
+"""
+
+ASSETS = 'assets'
+ACCOUNTS = 'accounts'
+
+# Columns of the joined account are named with this prefix, e.g. 'Account:Category__c'
+JOINED_ACCOUNT_PREFIX = 'Account:'
+
+
+def _is_ordered(column: np.ndarray) -> bool:
+    return np.issubdtype(column.dtype, np.datetime64) or np.issubdtype(column.dtype, np.number)
+
+
+def _to_comparable(value, column: np.ndarray):
+    # an empty string stands for a missing value, like in the string columns
+    if np.issubdtype(column.dtype, np.datetime64):
+        return np.datetime64('NaT') if value == '' else np.datetime64(pd.Timestamp(value).date(), 'D')
+    if np.issubdtype(column.dtype, np.number):
+        if value == '':
+            return np.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise Exception("Cannot compare a numeric column with " + repr(value))
+
+    return str(value)
+
+
+def _ordered_comparable(value, column: np.ndarray):
+    if not _is_ordered(column):
+        raise Exception("Order operators only work on date and numeric columns.")
+
+    return _to_comparable(value, column)
+
+
+def _equal(column: np.ndarray, value) -> np.ndarray:
+    comparable = _to_comparable(value, column)
+    if _is_ordered(column) and pd.isnull(comparable):
+        return pd.isnull(column)
+
+    return column == comparable
+
+
+def _not_equal(column: np.ndarray, value) -> np.ndarray:
+    return ~_equal(column, value)
+
+
+def _less(column: np.ndarray, value) -> np.ndarray:
+    return column < _ordered_comparable(value, column)
+
+
+def _less_equal(column: np.ndarray, value) -> np.ndarray:
+    return column <= _ordered_comparable(value, column)
+
+
+def _greater(column: np.ndarray, value) -> np.ndarray:
+    return column > _ordered_comparable(value, column)
+
+
+def _greater_equal(column: np.ndarray, value) -> np.ndarray:
+    return column >= _ordered_comparable(value, column)
+
+
+def _is_in(column: np.ndarray, values) -> np.ndarray:
+    comparables = [_to_comparable(value, column) for value in values]
+    if not _is_ordered(column):
+        return np.isin(column, comparables)
+
+    # missing values never compare equal, so they are matched separately
+    mask = np.isin(column, [comparable for comparable in comparables if not pd.isnull(comparable)])
+    if any(pd.isnull(comparable) for comparable in comparables):
+        mask |= pd.isnull(column)
+
+    return mask
+
+
+def _not_in(column: np.ndarray, values) -> np.ndarray:
+    return ~_is_in(column, values)
+
+
+def _contains(column: np.ndarray, value) -> np.ndarray:
+    return np.char.find(column.astype(str), str(value)) >= 0
+
+
+def _startswith(column: np.ndarray, value) -> np.ndarray:
+    return np.char.startswith(column.astype(str), str(value))
+
+
+OPERATORS = {
+    '==': _equal,
+    '!=': _not_equal,
+    '<': _less,
+    '<=': _less_equal,
+    '>': _greater,
+    '>=': _greater_equal,
+    'in': _is_in,
+    'not in': _not_in,
+    'contains': _contains,
+    'startswith': _startswith,
+}
+
+
+class Query:
+    """
+    Immutable description of a query over the assets or the accounts.
+    Every builder method returns a new Query, so partial queries can be shared and reused.
+    Example: Query().where('AccountId', 'in', ids).join_accounts().select('Id', 'Account:Name')
+    """
+    def __init__(self, table: str = ASSETS, predicates: typing.Tuple = (), joined: bool = False,
+                 columns: typing.Tuple[str, ...] = ()):
+        """
+        Constructor for the Query class.
+        :param table: the table to query, ASSETS or ACCOUNTS
+        :param predicates: tuple of (column, operator, value) predicates that must all hold
+        :param joined: whether the assets are joined to their accounts (ASSETS only)
+        :param columns: the columns to return, all columns if empty
+        """
+        if table not in (ASSETS, ACCOUNTS):
+            raise Exception("Unknown table: " + str(table))
+        if joined and table != ASSETS:
+            raise Exception("Only the assets can be joined to the accounts.")
+
+        self._table = table
+        self._predicates = predicates
+        self._joined = joined
+        self._columns = columns
+
+    @property
+    def table(self) -> str:
+        return self._table
+
+    @property
+    def predicates(self) -> typing.Tuple:
+        return self._predicates
+
+    @property
+    def joined(self) -> bool:
+        return self._joined
+
+    @property
+    def columns(self) -> typing.Tuple[str, ...]:
+        return self._columns
+
+    def where(self, column: str, operator: str, value) -> 'Query':
+        """
+        Adds a predicate on a column. Values are compared as strings, except on date and numeric columns where they
+        are converted to dates or numbers first; <, <=, > and >= only work on date and numeric columns.
+        :param column: the column name, prefixed with JOINED_ACCOUNT_PREFIX for a column of the joined account
+        :param operator: one of the keys of OPERATORS
+        :param value: the value to compare with, an iterable of values for 'in' and 'not in'; values must be
+        hashable so the query can be cached
+        :return: a new Query with the predicate added
+        """
+        if operator not in OPERATORS:
+            raise Exception("Unknown operator: " + str(operator))
+        if operator in ('in', 'not in'):
+            if isinstance(value, str):
+                raise Exception("Operator '{}' needs an iterable of values, not a string.".format(operator))
+            value = tuple(value)
+        try:
+            hash(value)
+        except TypeError:
+            raise Exception("Query values must be hashable: " + repr(value))
+
+        return Query(self._table, self._predicates + ((column, operator, value),), self._joined, self._columns)
+
+    def join_accounts(self) -> 'Query':
+        """
+        Joins every asset to the row of its AccountId in the accounts file.
+        :return: a new Query with the account columns available under JOINED_ACCOUNT_PREFIX
+        """
+        return Query(self._table, self._predicates, True, self._columns)
+
+    def select(self, *columns: str) -> 'Query':
+        """
+        Sets the columns returned by the query.
+        :param columns: the column names, in the order they are returned
+        :return: a new Query with the projection set
+        """
+        return Query(self._table, self._predicates, self._joined, tuple(columns))
+
+    def _key(self) -> typing.Tuple:
+        return self._table, self._predicates, self._joined, self._columns
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Query) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return 'Query(table={!r}, predicates={!r}, joined={!r}, columns={!r})'.format(*self._key())
+
+
+def compile_mask(query: Query, get_column: typing.Callable[[str], np.ndarray], row_count: int) -> np.ndarray:
+    """
+    Compiles the predicates of a query into one boolean mask over the rows.
+    :param query: the query to compile
+    :param get_column: function returning the values of a column as an array aligned with the rows
+    :param row_count: the number of rows in the table (header excluded)
+    :return: a boolean array, True for the rows matching every predicate
+    """
+    mask = np.ones(row_count, dtype=bool)
+    for column, operator, value in query.predicates:
+        mask &= OPERATORS[operator](get_column(column), value)
+
+    return mask
@@ -0,0 +1,177 @@
+import datetime
+import json
+import sqlite3
+import typing
+
+"""
+This script keeps an append-only history of the inventory changes found by CombinedFiles in a local SQLite database.
+Every combine run is stored with the asset changes it found, so the path of an asset or the sales of a distributor can
+be looked up without diffing old CSV snapshots again.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_timestamp TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    run_timestamp TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    distributor_id TEXT NOT NULL,
+    old_account_id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    is_sale INTEGER NOT NULL,
+    changed_columns TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_asset_id ON changes (asset_id, run_timestamp);
+CREATE INDEX IF NOT EXISTS changes_account_id ON changes (account_id, run_timestamp);
+CREATE INDEX IF NOT EXISTS changes_distributor_id ON changes (distributor_id, is_sale, run_timestamp);
+CREATE INDEX IF NOT EXISTS changes_run_timestamp ON changes (run_timestamp);
+CREATE TRIGGER IF NOT EXISTS changes_no_update BEFORE UPDATE ON changes
+BEGIN
+    SELECT RAISE(ABORT, 'The change history is append-only.');
+END;
+CREATE TRIGGER IF NOT EXISTS changes_no_delete BEFORE DELETE ON changes
+BEGIN
+    SELECT RAISE(ABORT, 'The change history is append-only.');
+END;
+"""
+
+_CHANGE_COLUMNS = ('run_id', 'run_timestamp', 'asset_id', 'distributor_id', 'old_account_id', 'account_id', 'is_sale',
+                   'changed_columns')
+
+
+def _timestamp(value: typing.Union[str, datetime.date, None]) -> str:
+    """
+    Formats a run timestamp so the stored timestamps sort and compare as text.
+    :param value: a datetime, a date or an ISO string; the current time if None
+    :return: the timestamp as an ISO string with second precision
+    """
+    if value is None:
+        value = datetime.datetime.now()
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+
+    return value.isoformat(timespec='seconds')
+
+
+class ChangeHistory:
+    """
+    Append-only store of the inventory changes of every combine run, indexed by asset id, account id, distributor id
+    and run timestamp.
+    """
+    def __init__(self, db_file_name: str = 'change_history.db'):
+        """
+        Constructor for the ChangeHistory class. Creates the database and its indexes if they do not exist.
+        :param db_file_name: the SQLite database file name, ':memory:' for a throwaway history
+        """
+        self._connection = sqlite3.connect(db_file_name)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self) -> 'ChangeHistory':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record_run(self, header: typing.List[str], changes: typing.List[typing.List[typing.List[str]]],
+                   distributor_ids: typing.Dict[str, str], run_timestamp=None, source: str = '') -> int:
+        """
+        Appends a combine run and all its changes in one transaction.
+        :param header: the column names of the asset rows
+        :param changes: the [original row, changed row] pairs of the same asset; the run is rejected if the Ids of a
+        pair differ
+        :param distributor_ids: dictionary of asset id -> id of the distributor the asset was sent to
+        :param run_timestamp: when the run happened (datetime, date or ISO string), now if not given
+        :param source: free text describing the run, e.g. the combined file names
+        :return: the id of the new run
+        """
+        run_timestamp = _timestamp(run_timestamp)
+        asset_id_index = header.index('Id')
+        account_id_index = header.index('AccountId')
+
+        rows = []
+        for original, changed in changes:
+            if original[asset_id_index] != changed[asset_id_index]:
+                raise Exception("Change pair of assets {} and {} is not the same asset; run not recorded.".format(
+                    original[asset_id_index], changed[asset_id_index]))
+            changed_columns = {name: [old, new] for name, old, new in zip(header, original, changed) if old != new}
+            rows.append((run_timestamp, str(original[asset_id_index]),
+                         distributor_ids.get(original[asset_id_index], ''),
+                         str(original[account_id_index]), str(changed[account_id_index]),
+                         int(original[account_id_index] != changed[account_id_index]),
+                         json.dumps(changed_columns, default=str)))
+
+        with self._connection:
+            cursor = self._connection.execute('INSERT INTO runs (run_timestamp, source) VALUES (?, ?)',
+                                              (run_timestamp, source))
+            run_id = cursor.lastrowid
+            self._connection.executemany('INSERT INTO changes ({}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'.format(
+                ', '.join(_CHANGE_COLUMNS)), [(run_id,) + row for row in rows])
+
+        return run_id
+
+    def _select_changes(self, where: str, parameters: typing.Tuple) -> typing.List[typing.Dict]:
+        cursor = self._connection.execute('SELECT {} FROM changes WHERE {} ORDER BY run_timestamp, change_id'.format(
+            ', '.join(_CHANGE_COLUMNS), where), parameters)
+        result = []
+        for row in cursor:
+            change = dict(row)
+            change['is_sale'] = bool(change['is_sale'])
+            change['changed_columns'] = json.loads(change['changed_columns'])
+            result.append(change)
+
+        return result
+
+    def get_runs(self) -> typing.List[typing.Dict]:
+        """
+        Gets every recorded combine run.
+        :return: a list of dictionaries with the run id, timestamp and source, oldest first
+        """
+        cursor = self._connection.execute('SELECT run_id, run_timestamp, source FROM runs ORDER BY run_timestamp, '
+                                          'run_id')
+        return [dict(row) for row in cursor]
+
+    def get_asset_history(self, asset_id: str) -> typing.List[typing.Dict]:
+        """
+        Gets where an asset has been: every recorded change of the asset.
+        :param asset_id: the id of the asset
+        :return: a list of change dictionaries, oldest first
+        """
+        return self._select_changes('asset_id = ?', (asset_id,))
+
+    def get_changes_by_account(self, account_id: str) -> typing.List[typing.Dict]:
+        """
+        Gets the recorded changes that moved assets to or left assets in an account.
+        :param account_id: the id of the account the assets were moved to
+        :return: a list of change dictionaries, oldest first
+        """
+        return self._select_changes('account_id = ?', (account_id,))
+
+    def get_sales_by_distributor(self, distributor_id: str, start=None, end=None) -> typing.List[typing.Dict]:
+        """
+        Gets the sales (AccountId changes) of a distributor, optionally between two run timestamps.
+        :param distributor_id: the id of the distributor
+        :param start: the earliest run timestamp (inclusive), no limit if None
+        :param end: the latest run timestamp (exclusive), no limit if None
+        :return: a list of change dictionaries, oldest first
+        """
+        where = 'distributor_id = ? AND is_sale = 1'
+        parameters = (distributor_id,)
+        if start is not None:
+            where += ' AND run_timestamp >= ?'
+            parameters += (_timestamp(start),)
+        if end is not None:
+            where += ' AND run_timestamp < ?'
+            parameters += (_timestamp(end),)
+
+        return self._select_changes(where, parameters)
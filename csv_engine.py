@@ -0,0 +1,139 @@
+import csv
+import typing
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+"""
+This script reads the Dataloader.io CSV exports with a selectable parse engine.
+The 'pyarrow' engine uses the multi-threaded Arrow CSV reader, the 'pandas' engine the single-threaded pandas reader,
+and 'auto' picks pyarrow when it is installed. Both handle quoted fields spanning several lines (Description) and
+return the same values: missing cells are NaN and numeric and boolean columns are inferred the way pandas does.
+"""
+
+AUTO = 'auto'
+PYARROW = 'pyarrow'
+PANDAS = 'pandas'
+CSV_ENGINES = (AUTO, PYARROW, PANDAS)
+
+# The texts pandas reads as booleans by default (e.g. Salesforce checkbox columns)
+_BOOLEAN_VALUES = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+# The texts pandas reads as missing values by default
+_NULL_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+                'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def resolve_engine(engine: str) -> str:
+    """
+    Resolves the engine name to the reader that is used.
+    :param engine: one of CSV_ENGINES
+    :return: PYARROW or PANDAS
+    """
+    if engine not in CSV_ENGINES:
+        raise Exception("Unknown CSV engine: " + str(engine))
+    if engine == AUTO:
+        return PANDAS if pa_csv is None else PYARROW
+    if engine == PYARROW and pa_csv is None:
+        raise Exception("The pyarrow CSV engine needs the pyarrow package.")
+
+    return engine
+
+
+def _read_header(file_name: str) -> typing.List[str]:
+    with open(file_name, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def _read_table_pyarrow(file_name: str, column_types: typing.Dict) -> 'pa.Table':
+    return pa_csv.read_csv(file_name,
+                           read_options=pa_csv.ReadOptions(use_threads=True),
+                           parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                           convert_options=pa_csv.ConvertOptions(
+                               column_types=column_types, null_values=_NULL_VALUES, strings_can_be_null=True,
+                               true_values=[text for text, value in _BOOLEAN_VALUES.items() if value],
+                               false_values=[text for text, value in _BOOLEAN_VALUES.items() if not value]))
+
+
+def _is_pandas_type(data_type) -> bool:
+    return (pa.types.is_int64(data_type) or pa.types.is_float64(data_type) or pa.types.is_boolean(data_type) or
+            pa.types.is_string(data_type) or pa.types.is_null(data_type))
+
+
+def _read_csv_pyarrow(file_name: str, infer_types: bool) -> pd.DataFrame:
+    header = _read_header(file_name)
+    if not header:
+        return pd.DataFrame()
+
+    # Arrow infers the column types itself, in parallel; text is forced only where pandas would not convert
+    column_types = {} if infer_types else {name: pa.string() for name in header}
+    table = _read_table_pyarrow(file_name, column_types)
+    if infer_types:
+        kept_as_text = [field.name for field in table.schema if not _is_pandas_type(field.type)]
+        if kept_as_text:
+            # pandas keeps dates and times as text, so these columns are read again as strings
+            table = _read_table_pyarrow(file_name, {name: pa.string() for name in kept_as_text})
+        for index, field in enumerate(table.schema):
+            if pa.types.is_null(field.type):
+                # an empty column is float NaN in pandas
+                table = table.set_column(index, field.name, table.column(index).cast(pa.float64()))
+
+    return table.to_pandas()
+
+
+def infer_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the columns of a DataFrame read as text the way pandas infers them when reading a CSV file: columns
+    holding only pandas' true/false texts become booleans and columns holding only numbers become numeric.
+    :param df: the DataFrame with every column as text and NaN for the missing values
+    :return: the DataFrame with the converted columns
+    """
+    for name in df.columns:
+        present = df[name].dropna()
+        if len(present) and present.isin(_BOOLEAN_VALUES.keys()).all():
+            df[name] = df[name].map(_BOOLEAN_VALUES)
+            continue
+        try:
+            df[name] = pd.to_numeric(df[name])
+        except (ValueError, TypeError):
+            pass
+
+    return df
+
+
+def read_csv_frame(file_name: str, engine: str = AUTO, infer_types: bool = True) -> pd.DataFrame:
+    """
+    Reads a CSV file into a DataFrame.
+    :param file_name: the CSV file name
+    :param engine: one of CSV_ENGINES; the pyarrow engine falls back to pandas for files Arrow cannot parse
+    :param infer_types: convert numeric columns to numbers; every column stays text if False
+    :return: the DataFrame, empty (no columns) if the file is empty
+    """
+    if resolve_engine(engine) == PYARROW:
+        try:
+            return _read_csv_pyarrow(file_name, infer_types)
+        except pa.ArrowInvalid:
+            # Arrow rejects ragged rows (e.g. unquoted multi-line values) that pandas still reads
+            pass
+
+    try:
+        return pd.read_csv(file_name, dtype=None if infer_types else str)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+def read_csv_array(file_name: str, engine: str = AUTO, infer_types: bool = True) -> np.ndarray:
+    """
+    Reads a CSV file into an array with the header row on top and empty strings for the missing values.
+    :param file_name: the CSV file name
+    :param engine: one of CSV_ENGINES
+    :param infer_types: convert numeric columns to numbers; every column stays text if False
+    :return: the array, with only the header row (or no column) if the file has no data
+    """
+    df = read_csv_frame(file_name, engine, infer_types)
+    return np.vstack((df.columns.tolist(), df.fillna('').to_numpy()))
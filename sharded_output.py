@@ -0,0 +1,84 @@
+import json
+import os
+import typing
+from uploader import batch_to_csv, iter_csv_batches
+
+"""
+This script writes large CSV outputs as numbered parts that stay under a row and/or size cap, with a JSON manifest
+listing the parts. The rows are streamed, so only one part is held in memory at a time.
+The part names only depend on the base file name and the part number, so the same input always gives the same files.
+"""
+
+# Excel stops at 1,048,576 rows, one of which is the header
+EXCEL_MAX_ROWS = 1048575
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def manifest_file_name(base_file_name: str) -> str:
+    return base_file_name + MANIFEST_SUFFIX
+
+
+def is_manifest(file_name: str) -> bool:
+    return file_name.endswith(MANIFEST_SUFFIX)
+
+
+def read_manifest(file_name: str) -> typing.Dict:
+    """
+    Reads a manifest written by write_shards.
+    :param file_name: the manifest file name
+    :return: the manifest dictionary, with the part file names resolved relative to the manifest directory
+    """
+    try:
+        with open(file_name, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except IOError:
+        raise Exception("Manifest file not found.")
+
+    directory = os.path.dirname(file_name)
+    for part in manifest['parts']:
+        part['file'] = os.path.join(directory, part['file'])
+
+    return manifest
+
+
+def write_shards(header: typing.Sequence, rows: typing.Iterable[typing.Sequence], base_file_name: str,
+                 max_rows: int = EXCEL_MAX_ROWS, max_bytes: int = None) -> str:
+    """
+    Streams rows into <base_file_name>.part0001.csv, <base_file_name>.part0002.csv, ... and writes the manifest
+    <base_file_name>.manifest.json. Every part repeats the header. Parts left over from a previous, larger write with
+    the same base name are removed.
+    :param header: the column names row
+    :param rows: the data rows (without the header), any iterable
+    :param base_file_name: the path of the output without extension
+    :param max_rows: the maximum number of data rows in a part
+    :param max_bytes: the maximum size in bytes of a part, no size cap if None
+    :return: the manifest file name
+    """
+    manifest_name = manifest_file_name(base_file_name)
+    old_parts = []
+    if os.path.exists(manifest_name):
+        old_parts = [part['file'] for part in read_manifest(manifest_name)['parts']]
+
+    parts = []
+    total_rows = 0
+    batches = iter_csv_batches(header, rows, max_rows, float('inf') if max_bytes is None else max_bytes)
+    for part_number, batch in enumerate(batches, start=1):
+        part_name = '{}.part{:04d}.csv'.format(base_file_name, part_number)
+        csv_data = batch_to_csv(header, batch).encode('utf-8')
+        with open(part_name, 'wb') as f:
+            f.write(csv_data)
+
+        parts.append({'file': os.path.basename(part_name), 'rows': len(batch), 'bytes': len(csv_data)})
+        total_rows += len(batch)
+
+    written = {os.path.join(os.path.dirname(base_file_name), part['file']) for part in parts}
+    for part_name in old_parts:
+        if part_name not in written and os.path.exists(part_name):
+            os.remove(part_name)
+
+    manifest = {'header': list(header), 'rows': total_rows, 'max_rows': max_rows, 'max_bytes': max_bytes,
+                'parts': parts}
+    with open(manifest_name, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    return manifest_name
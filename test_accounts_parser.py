@@ -1,5 +1,9 @@
+import os
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
+import threading
 import typing
 from unittest import TestCase
 from accounts_parser import AccountsAndAssets, AccountTypes, CombinedFiles
@@ -167,6 +171,141 @@ class TestInitAndAssets(TestAccountsAndAssets):
         account_split.split_assets_and_save_csv()
 
 
+class TestWarrantyExpiration(TestCase):
+    def setUp(self) -> None:
+        self.accounts = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv')
+        self.nexty_id = '0011U000008Dh2dQAC'
+
+    def test_warranty_expiration_arr(self):
+        result = self.accounts.get_warranty_expiration_arr[:4].astype(str).tolist()
+        expected = ['2021-06-14', '2021-06-14', 'NaT', 'NaT']
+        self.assertEqual(expected, result)
+
+    def test_assets_expiring_between_distributor(self):
+        result = sorted(self.accounts.get_assets_expiring_between('9/1/2021', '9/30/2021', self.nexty_id))
+        expected = file_prep(pd.read_csv('test/nexty_assets_expected.csv'))[:-1]
+        self.assertEqual(sorted(expected), result)
+
+    def test_assets_expiring_between_empty(self):
+        result = self.accounts.get_assets_expiring_between('1/1/2030', '12/31/2030')
+        self.assertEqual([], result)
+
+    def test_expiring_assets_by_distributor(self):
+        result = self.accounts.get_expiring_assets_by_distributor('2021-09-03', '2021-09-03')
+        self.assertEqual([self.nexty_id], list(result.keys()))
+        self.assertEqual(13, len(result[self.nexty_id]))
+
+    def test_expired_distributor_inventory(self):
+        result = self.accounts.get_expired_distributor_inventory('9/4/2021', self.nexty_id)
+        self.assertEqual(12, len(result))
+
+    def test_expired_distributor_inventory_not_expired(self):
+        result = self.accounts.get_expired_distributor_inventory('9/3/2021', self.nexty_id)
+        self.assertEqual([], result)
+
+
+class TestSnapshots(TestCase):
+    def setUp(self) -> None:
+        self.accounts = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv')
+
+    def test_snapshot_is_read_only(self):
+        snapshot = self.accounts.get_snapshot
+        self.assertRaises(ValueError, snapshot.get_assets_arr.__setitem__, (1, 1), '')
+        self.assertRaises(ValueError, snapshot.get_account_arr.__setitem__, (1, 1), '')
+        self.assertRaises(ValueError, snapshot.get_warranty_expiration_arr.__setitem__, 0, np.datetime64('NaT'))
+
+    def test_reload_swaps_snapshot(self):
+        snapshot = self.accounts.get_snapshot
+        assets_arr = snapshot.get_assets_arr
+        self.accounts.reload()
+
+        self.assertIsNot(snapshot, self.accounts.get_snapshot)
+        self.assertIs(assets_arr, snapshot.get_assets_arr)
+        self.assertEqual(assets_arr.tolist(), self.accounts.get_assets_arr.tolist())
+
+    def test_reload_assets_reuses_account_index(self):
+        snapshot = self.accounts.get_snapshot
+        self.accounts.reload_assets()
+        self.assertIs(snapshot.get_account_arr, self.accounts.get_account_arr)
+        self.assertIs(snapshot._accounts_sorted_ids, self.accounts.get_snapshot._accounts_sorted_ids)
+
+    def test_concurrent_readers_during_reload(self):
+        expected = sorted(self.accounts.get_all_assets_by_distributor('0011U000008Dh2dQAC'))
+        errors = []
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                snapshot = self.accounts.get_snapshot
+                try:
+                    self.assertEqual(len(snapshot.get_assets_arr) - 1, len(snapshot.get_asset_distributor_arr))
+                    self.assertEqual(expected, sorted(self.accounts.get_all_assets_by_distributor('0011U000008Dh2dQAC')))
+                except Exception as e:
+                    errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for _ in range(10):
+            self.accounts.reload()
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+        self.assertEqual([], errors)
+
+
+class TestReconcileDenormalizedColumns(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.assets_file = os.path.join(self.directory, 'assets.csv')
+        assets_df = pd.read_csv('all_assets_from_distributors.csv')
+        # Nexty sold an asset to Aisin Group, a Johnan Corp account, without updating the denormalized columns
+        assets_df.loc[assets_df['Id'] == '02i1U000000OFDfQAO', 'AccountId'] = '0011U000008D4kPQAS'
+        assets_df.to_csv(self.assets_file, index=False)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_reconcile_denormalized_columns(self):
+        accounts = AccountsAndAssets('distributors_and_children.csv', self.assets_file)
+        snapshot = accounts.get_snapshot
+        result = accounts.reconcile_denormalized_columns()
+        expected = [['02i1U000000OFDfQAO', 'Account.Name', 'Nexty', 'Aisin Group'],
+                    ['02i1U000000OFDfQAO', 'Account.Partner_Owner__c', '', '0011U000007zcnLQAQ']]
+
+        self.assertEqual(expected, result)
+        self.assertIsNot(snapshot, accounts.get_snapshot)
+        row = [row for row in accounts.get_assets_arr.tolist() if row[0] == '02i1U000000OFDfQAO'][0]
+        self.assertEqual(['Aisin Group', '0011U000007zcnLQAQ'], row[-2:])
+        self.assertNotIn(row, accounts.get_all_assets_by_distributor('0011U000008Dh2dQAC'))
+        self.assertIn(row, accounts.get_all_assets_by_distributor('0011U000007zcnLQAQ'))
+
+    def test_reconcile_denormalized_columns_consistent(self):
+        accounts = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv')
+        snapshot = accounts.get_snapshot
+        self.assertEqual([], accounts.reconcile_denormalized_columns())
+        self.assertIs(snapshot, accounts.get_snapshot)
+
+    def test_reconcile_combined(self):
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        combined_files.add_file('test/real_data/real_data_A_changed.csv')
+        combined_files.add_file('test/real_data/real_data_B_changed.csv')
+        combined_files.combine_files()
+        result = combined_files.reconcile_combined()
+        expected = [['02i1U000003m9emQAA', 'Account.Name', 'Johnan Corp', 'Aisin Group'],
+                    ['02i1U000003mD1kQAE', 'Account.Name', 'Next.Robotics', 'Johnan Corp'],
+                    ['02i1U000003m9emQAA', 'Account.Partner_Owner__c', '', '0011U000007zcnLQAQ']]
+
+        self.assertEqual(expected, result)
+        row = [row for row in combined_files.get_combined_list if row[0] == '02i1U000003mD1kQAE'][0]
+        self.assertEqual(['0011U000007zcnLQAQ', 'Johnan Corp', ''], [row[1], row[-2], row[-1]])
+
+    def test_reconcile_combined_empty(self):
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        self.assertEqual([], combined_files.reconcile_combined())
+
+
 class TestCombinedFiles(TestCase):
     def setUp(self) -> None:
         self.combined_files = CombinedFiles('distributors_and_children.csv', 'test/B.csv')
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import threading
+import numpy as np
+from unittest import TestCase
+from accounts_parser import AccountsAndAssets, AccountTypes
+from asset_query import ACCOUNTS, ASSETS, Query
+
+
+class TestQuery(TestCase):
+    def test_builder_is_immutable(self):
+        query = Query().where('AccountId', '==', 'a')
+        query.select('Id')
+        self.assertEqual((), query.columns)
+        self.assertEqual((('AccountId', '==', 'a'),), query.predicates)
+
+    def test_equal_queries_hash_the_same(self):
+        first = Query().where('AccountId', 'in', ['a', 'b']).select('Id')
+        second = Query().where('AccountId', 'in', ('a', 'b')).select('Id')
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+
+    def test_unknown_operator(self):
+        self.assertRaises(Exception, Query().where, 'AccountId', '=~', 'a')
+
+    def test_unhashable_value(self):
+        self.assertRaises(Exception, Query().where, 'AccountId', '==', ['a', 'b'])
+        self.assertRaises(Exception, Query().where, 'AccountId', 'in', [['a'], ['b']])
+
+    def test_in_needs_iterable_of_values(self):
+        self.assertRaises(Exception, Query().where, 'AccountId', 'in', 'abc')
+
+    def test_join_accounts_table(self):
+        self.assertRaises(Exception, Query(ACCOUNTS).join_accounts)
+
+
+class TestAccountsAndAssetsQuery(TestCase):
+    def setUp(self) -> None:
+        self.accounts = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv')
+        self.johnan_id = '0011U000007zcnLQAQ'
+
+    def test_accounts_by_type(self):
+        result = self.accounts.query(Query(ACCOUNTS).where('Category__c', '==', 'Distributor').select('Id'))
+        expected = sorted(self.accounts.get_accounts_by_type(AccountTypes.DISTRIBUTOR))
+        self.assertEqual(['Id'], result[0].tolist())
+        self.assertEqual(expected, sorted(result[1:, 0].tolist()))
+
+    def test_assets_by_distributor(self):
+        result = self.accounts.query(Query().where('Distributor', '==', self.johnan_id))
+        expected = sorted(self.accounts.get_all_assets_by_distributor(self.johnan_id))
+        self.assertEqual(self.accounts.get_assets_arr[0].tolist(), result[0].tolist())
+        self.assertEqual(expected, sorted(result[1:].tolist()))
+
+    def test_join_and_select(self):
+        query = Query().join_accounts().where('Account:Category__c', '==', 'End-User').select('Id', 'Account:Name')
+        result = self.accounts.query(query)
+        self.assertEqual(['Id', 'Account:Name'], result[0].tolist())
+        self.assertEqual({'Aisin Group', 'FFT', 'Sony Electronics Inc'}, set(result[1:, 1].tolist()))
+
+    def test_join_unknown_account(self):
+        query = Query().join_accounts().where('Account.Name', '==', 'Honda').select('Account:Name')
+        result = self.accounts.query(query)
+        self.assertEqual([['Account:Name'], ['']], result.tolist())
+
+    def test_account_column_without_join(self):
+        self.assertRaises(Exception, self.accounts.query, Query().select('Account:Name'))
+
+    def test_unknown_column(self):
+        self.assertRaises(Exception, self.accounts.query, Query().where('Bogus', '==', ''))
+
+    def test_date_and_string_predicates(self):
+        query = (Query().where('Warranty_Expiration', '>=', '9/1/2021').where('Name', 'startswith', 'RS ')
+                 .where('AccountId', 'not in', [self.johnan_id]).select('Name'))
+        result = self.accounts.query(query)
+        self.assertEqual(['RS 0011', 'RS 0012', 'RS 0013', 'RS 0014'], sorted(result[1:, 0].tolist()))
+
+    def test_no_match(self):
+        result = self.accounts.query(Query().where('Name', 'contains', 'bogus').select('Id', 'Name'))
+        self.assertEqual((1, 2), result.shape)
+
+    def test_result_cache(self):
+        query = Query().where('Name', 'contains', 'MPA')
+        result = self.accounts.query(query)
+        self.assertIs(result, self.accounts.query(query))
+        self.assertFalse(result.flags.writeable)
+
+        self.accounts.reload()
+        reloaded = self.accounts.query(query)
+        self.assertIsNot(result, reloaded)
+        self.assertTrue(np.array_equal(result, reloaded))
+
+    def test_concurrent_join_columns(self):
+        query = Query().join_accounts().where('Account:Category__c', '==', 'End-User').select('Id', 'Account:Name')
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.accounts.query(query.where('Id', '!=', i))))
+                   for i in range(8)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+
+        snapshot = self.accounts.get_snapshot
+        self.assertEqual(8, len(results))
+        self.assertTrue(all(np.array_equal(results[0], result) for result in results))
+        self.assertFalse(snapshot._get_query_column(ASSETS, 'Account:Name').flags.writeable)
+
+    def test_order_operator_on_text_column(self):
+        self.assertRaises(Exception, self.accounts.query, Query().where('Name', '>', 'MPA 0100'))
+
+
+class TestNumericQuery(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        assets_file = os.path.join(self.directory.name, 'assets.csv')
+        with open(assets_file, 'w') as f:
+            f.write('Id,AccountId,Name,Quantity,Account.Name,Account.Partner_Owner__c\n'
+                    '02i1,0011U000007zcnLQAQ,MPA 0001,5,Johnan Corp,\n'
+                    '02i2,0011U000007zcnLQAQ,MPA 0002,12.5,Johnan Corp,\n'
+                    '02i3,0011U000007zcnLQAQ,MPA 0003,,Johnan Corp,\n')
+        self.accounts = AccountsAndAssets('distributors_and_children.csv', assets_file)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def names(self, query: Query) -> list:
+        return sorted(self.accounts.query(query.select('Name'))[1:, 0].tolist())
+
+    def test_equal_compares_numbers(self):
+        self.assertEqual(['MPA 0001'], self.names(Query().where('Quantity', '==', 5)))
+        self.assertEqual(['MPA 0001'], self.names(Query().where('Quantity', '==', '5')))
+        self.assertEqual(['MPA 0002', 'MPA 0003'], self.names(Query().where('Quantity', '!=', 5)))
+
+    def test_order_compares_numbers(self):
+        # as text '12.5' < '5.0', as numbers it is the other way around
+        self.assertEqual(['MPA 0002'], self.names(Query().where('Quantity', '>', 5)))
+        self.assertEqual(['MPA 0001'], self.names(Query().where('Quantity', '<', 10)))
+
+    def test_missing_numbers(self):
+        self.assertEqual(['MPA 0003'], self.names(Query().where('Quantity', '==', '')))
+        self.assertEqual(['MPA 0001', 'MPA 0003'], self.names(Query().where('Quantity', 'in', [5, ''])))
+
+    def test_not_a_number(self):
+        self.assertRaises(Exception, self.accounts.query, Query().where('Quantity', '==', 'five'))
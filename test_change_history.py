@@ -0,0 +1,99 @@
+import datetime
+import os
+import sqlite3
+import tempfile
+import pandas as pd
+from unittest import TestCase
+from accounts_parser import CombinedFiles
+from change_history import ChangeHistory
+
+
+class TestChangeHistory(TestCase):
+    def setUp(self) -> None:
+        self.history = ChangeHistory(':memory:')
+        self.combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        self.combined_files.add_file('test/real_data/real_data_A_changed.csv')
+        self.combined_files.add_file('test/real_data/real_data_B_changed.csv')
+        self.combined_files.combine_files()
+        self.combined_files.show_changes()
+
+    def tearDown(self) -> None:
+        self.history.close()
+
+    def test_record_changes(self):
+        run_id = self.combined_files.record_changes(self.history, datetime.datetime(2021, 10, 1, 12))
+        runs = self.history.get_runs()
+        self.assertEqual([run_id], [run['run_id'] for run in runs])
+        self.assertEqual('2021-10-01T12:00:00', runs[0]['run_timestamp'])
+        self.assertEqual('test/real_data/real_data_A_changed.csv, test/real_data/real_data_B_changed.csv',
+                         runs[0]['source'])
+
+    def test_get_asset_history(self):
+        self.combined_files.record_changes(self.history, '2021-10-01')
+        self.combined_files.record_changes(self.history, '2021-09-01')
+        result = self.history.get_asset_history('02i1U000003m9emQAA')
+
+        self.assertEqual(['2021-09-01T00:00:00', '2021-10-01T00:00:00'], [change['run_timestamp'] for change in result])
+        self.assertEqual('0011U000007zcnLQAQ', result[0]['old_account_id'])
+        self.assertEqual('0011U000008D4kPQAS', result[0]['account_id'])
+        self.assertEqual('0011U000007zcnLQAQ', result[0]['distributor_id'])
+        self.assertTrue(result[0]['is_sale'])
+        self.assertEqual({'AccountId': ['0011U000007zcnLQAQ', '0011U000008D4kPQAS']}, result[0]['changed_columns'])
+
+    def test_get_changes_by_account(self):
+        self.combined_files.record_changes(self.history)
+        result = self.history.get_changes_by_account('0011U000007zcnLQAQ')
+        self.assertEqual(['02i1U000003mD1kQAE'], [change['asset_id'] for change in result])
+
+    def test_get_sales_by_distributor(self):
+        self.combined_files.record_changes(self.history, datetime.date(2020, 12, 31))
+        self.combined_files.record_changes(self.history, datetime.date(2021, 6, 1))
+        result = self.history.get_sales_by_distributor('0011U000007zcnLQAQ', '2021-01-01', '2022-01-01')
+
+        self.assertEqual(1, len(result))
+        self.assertEqual('2021-06-01T00:00:00', result[0]['run_timestamp'])
+        self.assertEqual(2, len(self.history.get_sales_by_distributor('0011U000007zcnLQAQ')))
+
+    def test_append_only(self):
+        self.combined_files.record_changes(self.history)
+        self.assertRaises(sqlite3.DatabaseError, self.history._connection.execute, 'DELETE FROM changes')
+        self.assertRaises(sqlite3.DatabaseError, self.history._connection.execute,
+                          "UPDATE changes SET account_id = ''")
+
+    def test_recorded_without_show_changes(self):
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        combined_files.add_file('test/real_data/real_data_A_changed.csv')
+        combined_files.add_file('test/real_data/real_data_B_changed.csv')
+        combined_files.combine_files()
+
+        run_id = combined_files.record_changes(self.history)
+        self.assertEqual([run_id], [run['run_id'] for run in self.history.get_runs()])
+
+    def test_no_changes_not_recorded(self):
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        combined_files.add_file('test/real_data/real_data_A.csv')
+        combined_files.add_file('test/real_data/real_data_B.csv')
+        combined_files.combine_files()
+
+        self.assertTrue(combined_files.is_complete())
+        self.assertIsNone(combined_files.record_changes(self.history))
+        self.assertEqual([], self.history.get_runs())
+
+    def test_missing_row_rejected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            returned_file = os.path.join(directory, 'real_data_A_changed.csv')
+            pd.read_csv('test/real_data/real_data_A_changed.csv', dtype=str)[1:].to_csv(returned_file, index=False)
+            combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+            combined_files.add_file(returned_file)
+            combined_files.add_file('test/real_data/real_data_B_changed.csv')
+            combined_files.combine_files()
+            combined_files.show_changes()
+
+            self.assertRaises(Exception, combined_files.record_changes, self.history)
+            self.assertEqual([], self.history.get_runs())
+
+    def test_record_run_pairs_same_asset(self):
+        header = ['Id', 'AccountId']
+        changes = [[['02i1', '0011'], ['02i2', '0012']]]
+        self.assertRaises(Exception, self.history.record_run, header, changes, {})
+        self.assertEqual([], self.history.get_runs())
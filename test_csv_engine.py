@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+from accounts_parser import AccountsAndAssets, CombinedFiles
+from csv_engine import PANDAS, PYARROW, pa_csv, read_csv_array, resolve_engine
+
+
+class TestCsvEngine(TestCase):
+    def test_unknown_engine(self):
+        self.assertRaises(Exception, resolve_engine, 'polars')
+
+    def test_auto_engine(self):
+        self.assertEqual(PANDAS if pa_csv is None else PYARROW, resolve_engine('auto'))
+
+    def test_header_only_file(self):
+        self.assertEqual((1, 7), read_csv_array('test/empty.csv', PANDAS).shape)
+        self.assertRaises(Exception, AccountsAndAssets, 'test/empty.csv', 'assets.csv')
+
+    def test_multi_line_accounts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            accounts_file = os.path.join(directory, 'accounts.csv')
+            with open(accounts_file, 'w') as f:
+                f.write('Id,Description,Name,Category__c,Partner_Owner__c\n'
+                        '0011U000008Dh2dQAC,"Tokyo office,\nOsaka office",Nexty,Distributor,\n')
+            accounts = AccountsAndAssets(accounts_file, 'all_assets_from_distributors.csv', PANDAS)
+
+            self.assertEqual('Tokyo office,\nOsaka office', accounts.get_account_arr[1][1])
+            self.assertEqual(['0011U000008Dh2dQAC'], accounts.get_account_ids())
+
+
+@unittest.skipIf(pa_csv is None, 'pyarrow is not installed')
+class TestPyarrowEngine(TestCase):
+    def test_same_arrays_as_pandas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkbox_file = os.path.join(directory, 'checkbox.csv')
+            with open(checkbox_file, 'w') as f:
+                f.write('Id,Active__c,Shipped__c,Name,Quantity,Installed,Time,Notes\n'
+                        '02i1,true,TRUE,True,0086,2021-06-14,12:30:00,\n'
+                        '02i2,false,,Nexty,7,2021-06-15,13:00:00,NA\n')
+
+            for file_name in ('assets.csv', 'all_assets_from_distributors.csv',
+                              'test/real_data/real_data_combined.csv', 'test/A.csv', checkbox_file):
+                for infer_types in (True, False):
+                    expected = read_csv_array(file_name, PANDAS, infer_types).tolist()
+                    result = read_csv_array(file_name, PYARROW, infer_types).tolist()
+                    self.assertEqual(expected, result)
+                    self.assertEqual([[type(value) for value in row] for row in expected],
+                                     [[type(value) for value in row] for row in result])
+
+            self.assertEqual([True, False], read_csv_array(checkbox_file, PYARROW)[1:, 1].tolist())
+
+    def test_ragged_rows_fall_back_to_pandas(self):
+        self.assertEqual(read_csv_array('output/0011U000007zcnLQAQ.csv', PANDAS).tolist(),
+                         read_csv_array('output/0011U000007zcnLQAQ.csv', PYARROW).tolist())
+
+    def test_accounts_and_assets(self):
+        expected = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv', PANDAS)
+        result = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv', PYARROW)
+
+        self.assertEqual(expected.get_account_arr.tolist(), result.get_account_arr.tolist())
+        self.assertEqual(expected.get_assets_arr.tolist(), result.get_assets_arr.tolist())
+        self.assertEqual(expected._asset_account_id, result._asset_account_id)
+
+    def test_combined_files(self):
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv',
+                                       PYARROW)
+        combined_files.add_file('test/real_data/real_data_A_changed.csv')
+        combined_files.add_file('test/real_data/real_data_B_changed.csv')
+        combined_files.combine_files()
+        combined_files.show_changes()
+
+        self.assertEqual(2, combined_files.get_inventory_change_number())
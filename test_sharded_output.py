@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+from unittest import TestCase
+from accounts_parser import AccountsAndAssets, CombinedFiles
+from csv_engine import CSV_ENGINES
+from sharded_output import read_manifest, write_shards
+
+
+class TestWriteShards(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.base_file_name = os.path.join(self.directory, 'output')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_row_cap(self):
+        rows = ([str(i), 'name ' + str(i)] for i in range(7))
+        manifest = read_manifest(write_shards(['Id', 'Name'], rows, self.base_file_name, max_rows=3))
+
+        self.assertEqual(7, manifest['rows'])
+        self.assertEqual([3, 3, 1], [part['rows'] for part in manifest['parts']])
+        self.assertEqual(self.base_file_name + '.part0002.csv', manifest['parts'][1]['file'])
+        self.assertEqual(['3', '4', '5'], pd.read_csv(manifest['parts'][1]['file'], dtype=str)['Id'].tolist())
+
+    def test_byte_cap(self):
+        rows = [['0123456789'] for _ in range(5)]
+        manifest = read_manifest(write_shards(['Id'], rows, self.base_file_name, max_bytes=30))
+
+        self.assertTrue(all(part['bytes'] <= 30 for part in manifest['parts']))
+        self.assertTrue(all(os.path.getsize(part['file']) == part['bytes'] for part in manifest['parts']))
+
+    def test_stale_parts_removed(self):
+        write_shards(['Id'], [[str(i)] for i in range(6)], self.base_file_name, max_rows=2)
+        write_shards(['Id'], [[str(i)] for i in range(3)], self.base_file_name, max_rows=2)
+
+        expected = ['output.manifest.json', 'output.part0001.csv', 'output.part0002.csv']
+        self.assertEqual(expected, sorted(os.listdir(self.directory)))
+
+
+class TestShardedFiles(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_split_assets_and_save_shards(self):
+        accounts = AccountsAndAssets('distributors_and_children.csv', 'all_assets_from_distributors.csv')
+        result = accounts.split_assets_and_save_shards(max_rows=10, directory=self.directory)
+
+        self.assertEqual(['0011U000007zcnLQAQ', '0011U000008Dh2dQAC'], sorted(result.keys()))
+        manifest = read_manifest(result['0011U000007zcnLQAQ'])
+        self.assertEqual(43, manifest['rows'])
+        self.assertEqual([10, 10, 10, 10, 3], [part['rows'] for part in manifest['parts']])
+
+        parts = [pd.read_csv(part['file'], dtype=str) for part in manifest['parts']]
+        expected = [row[0] for row in accounts.get_all_assets_by_distributor('0011U000007zcnLQAQ')]
+        self.assertEqual(expected, pd.concat(parts)['Id'].tolist())
+
+    def test_combined_file_round_trip(self):
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        combined_files.add_file('test/real_data/real_data_A.csv')
+        combined_files.add_file('test/real_data/real_data_B.csv')
+        combined_files.combine_files()
+        manifest_name = combined_files.write_combined_file(max_rows=5,
+                                                           base_file_name=os.path.join(self.directory, 'combined'))
+
+        combined_files.add_file(manifest_name)
+        self.assertEqual(combined_files.get_combined_list, combined_files.get_files[manifest_name])
+
+    def test_round_trip_parts_inferred_differently(self):
+        # as a part of its own, the first two serial numbers would be read as the numbers 86 and 87
+        returned_file = os.path.join(self.directory, 'returned.csv')
+        returned_df = pd.read_csv('test/real_data/real_data_A.csv', dtype=str)[:3]
+        returned_df['SerialNumber'] = ['0086', '0087', 'RTR-0016']
+        returned_df.to_csv(returned_file, index=False)
+
+        for engine in CSV_ENGINES:
+            combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv',
+                                           engine)
+            combined_files.add_file(returned_file)
+            combined_files.combine_files()
+            manifest_name = combined_files.write_combined_file(
+                max_rows=2, base_file_name=os.path.join(self.directory, 'combined'))
+
+            combined_files.add_file(manifest_name)
+            self.assertEqual(combined_files.get_files[returned_file], combined_files.get_files[manifest_name])
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import pandas as pd
+from unittest import TestCase
+from accounts_parser import CombinedFiles
+from uploader import BatchSink, BatchUploader, LocalFileSink, iter_csv_batches
+
+
+class FlakySink(BatchSink):
+    """
+    Sink that fails the first attempts of every batch and keeps the accepted batches in memory.
+    """
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def send_batch(self, batch_number: int, csv_data: str) -> str:
+        with self.lock:
+            self.attempts[batch_number] = self.attempts.get(batch_number, 0) + 1
+            if self.attempts[batch_number] <= self.failures:
+                raise Exception("Upload refused.")
+            self.batches[batch_number] = csv_data
+
+        return 'batch ' + str(batch_number)
+
+
+class TestIterCsvBatches(TestCase):
+    def test_row_limit(self):
+        rows = [[str(i), 'a'] for i in range(7)]
+        result = [len(batch) for batch in iter_csv_batches(['Id', 'Name'], rows, max_rows=3)]
+        self.assertEqual([3, 3, 1], result)
+
+    def test_byte_limit(self):
+        rows = [['0123456789'] for _ in range(6)]
+        # header 'Id\n' is 3 bytes and every row is 11 bytes
+        result = [len(batch) for batch in iter_csv_batches(['Id'], rows, max_bytes=3 + 2 * 11)]
+        self.assertEqual([2, 2, 2], result)
+
+    def test_row_too_large(self):
+        batches = iter_csv_batches(['Id'], [['0123456789']], max_bytes=10)
+        self.assertRaises(Exception, list, batches)
+
+
+class TestBatchUploader(TestCase):
+    def setUp(self) -> None:
+        self.combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        self.combined_files.add_file('test/real_data/real_data_A.csv')
+        self.combined_files.add_file('test/real_data/real_data_B.csv')
+        self.combined_files.combine_files()
+
+    def test_local_file_sink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            uploader = BatchUploader(LocalFileSink(directory), max_rows=5, max_workers=2)
+            results = self.combined_files.upload_combined_file(uploader)
+
+            self.assertEqual(list(range(len(results))), [result.batch_number for result in results])
+            self.assertTrue(all(result.success for result in results))
+            self.assertEqual(sorted(os.listdir(directory)), sorted(os.path.basename(r.location) for r in results))
+
+            parts = [pd.read_csv(result.location).fillna('') for result in results]
+            result = pd.concat(parts).to_numpy().tolist()
+            expected = self.combined_files.get_combined_list[1:]
+            self.assertEqual(expected, result)
+
+    def test_retries(self):
+        sink = FlakySink(failures=2)
+        uploader = BatchUploader(sink, max_rows=10, max_retries=2, retry_delay=0)
+        results = self.combined_files.upload_combined_file(uploader)
+
+        self.assertTrue(all(result.success and result.attempts == 3 for result in results))
+        self.assertEqual(len(results), len(sink.batches))
+
+    def test_retries_exhausted(self):
+        uploader = BatchUploader(FlakySink(failures=5), max_rows=10, max_retries=1, retry_delay=0)
+        results = self.combined_files.upload_combined_file(uploader)
+
+        self.assertTrue(all(not result.success and result.attempts == 2 for result in results))
+        self.assertEqual('Upload refused.', results[0].error)
+
+    def test_oversized_row_uploads_nothing(self):
+        sink = FlakySink(failures=0)
+        rows = [['Id']] + [[str(i)] for i in range(10)] + [['x' * 100]]
+        uploader = BatchUploader(sink, max_rows=2, max_bytes=50, retry_delay=0)
+
+        self.assertRaises(Exception, uploader.upload, rows)
+        self.assertEqual({}, sink.attempts)
+
+    def test_sink_must_implement_send_batch(self):
+        class IncompleteSink(BatchSink):
+            pass
+
+        self.assertRaises(TypeError, IncompleteSink)
+
+    def test_nothing_to_upload(self):
+        uploader = BatchUploader(FlakySink(failures=0))
+        combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        self.assertEqual([], combined_files.upload_combined_file(uploader))
@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+from unittest import TestCase
+from accounts_parser import AccountsAndAssets, CombinedFiles
+from change_history import ChangeHistory
+from watcher import DirectoryWatcher, InventoryWatcher
+
+
+def _write(file_name: str, text: str):
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+class TestDirectoryWatcher(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'export.csv')
+        self.watcher = DirectoryWatcher(self.directory, settle_time=1.0)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_debounce_partial_write(self):
+        _write(self.file_name, 'Id,AccountId\n')
+        self.assertEqual([], self.watcher.poll(now=0))
+        _write(self.file_name, 'Id,AccountId\na,b\n')
+        self.assertEqual([], self.watcher.poll(now=0.5))
+        self.assertEqual([], self.watcher.poll(now=1.4))
+        self.assertEqual([self.file_name], self.watcher.poll(now=1.6))
+        self.assertEqual([], self.watcher.poll(now=5))
+
+    def test_mark_seen_and_pattern(self):
+        _write(self.file_name, 'Id\n')
+        _write(os.path.join(self.directory, 'notes.txt'), 'notes')
+        self.watcher.mark_seen()
+        self.watcher.poll(now=0)
+        self.assertEqual([], self.watcher.poll(now=2))
+
+
+class TestInventoryWatcher(TestCase):
+    def setUp(self) -> None:
+        self.resources = tempfile.mkdtemp()
+        self.returns = tempfile.mkdtemp()
+        self.accounts_file = os.path.join(self.resources, 'accounts.csv')
+        self.assets_file = os.path.join(self.resources, 'assets.csv')
+        shutil.copy('distributors_and_children.csv', self.accounts_file)
+        shutil.copy('all_assets_from_distributors.csv', self.assets_file)
+
+        self.accounts = AccountsAndAssets(self.accounts_file, self.assets_file)
+        self.combined_files = CombinedFiles('distributors_and_children.csv', 'test/real_data/real_data_combined.csv')
+        self.watcher = InventoryWatcher(self.accounts, self.combined_files, self.resources, self.returns,
+                                        settle_time=1.0, save_splits=False)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.resources)
+        shutil.rmtree(self.returns)
+
+    def test_reload_assets_affected_distributors(self):
+        assets_df = pd.read_csv(self.assets_file)
+        nexty_asset = assets_df.index[assets_df['Id'] == '02i1U000000OFDfQAO'][0]
+        assets_df.loc[nexty_asset, 'AccountId'] = '0011U000008D4kPQAS'
+        assets_df.to_csv(self.assets_file, index=False)
+
+        # the asset moved from Nexty inventory to Aisin Group, a Johnan Corp account
+        result = self.accounts.reload_assets()
+        self.assertEqual(['0011U000007zcnLQAQ', '0011U000008Dh2dQAC'], result)
+        self.assertEqual([], self.accounts.reload_assets())
+
+    def test_stale_partner_owner_affects_both_distributors(self):
+        assets_df = pd.read_csv(self.assets_file)
+        aisin_asset = assets_df.index[assets_df['Id'] == '02i1U0000006Ij3QAE'][0]
+        assets_df.loc[aisin_asset, 'Account.Partner_Owner__c'] = '0011U000008Dh2dQAC'
+        assets_df.to_csv(self.assets_file, index=False)
+        self.accounts.reload_assets()
+
+        # Aisin Group is a Johnan Corp account, but the stale owner also puts the asset in the Nexty split
+        assets_df.loc[aisin_asset, 'Name'] = 'MPA 9999'
+        assets_df.to_csv(self.assets_file, index=False)
+        self.assertEqual(['0011U000007zcnLQAQ', '0011U000008Dh2dQAC'], self.accounts.reload_assets())
+
+    def test_row_hashes_kept_on_snapshot(self):
+        snapshot = self.accounts.get_snapshot
+        self.assertIs(snapshot._asset_row_hashes(), snapshot._asset_row_hashes())
+
+    def test_stale_split_removed(self):
+        nexty_id = '0011U000008Dh2dQAC'
+        cwd = os.getcwd()
+        os.chdir(self.returns)
+        try:
+            self.accounts.split_assets_and_save_csv([nexty_id])
+            self.assertTrue(os.path.exists(nexty_id + '.csv'))
+
+            nexty_assets = [row[0] for row in self.accounts.get_all_assets_by_distributor(nexty_id)]
+            assets_df = pd.read_csv(self.assets_file)
+            assets_df[~assets_df['Id'].isin(nexty_assets)].to_csv(self.assets_file, index=False)
+            affected = self.accounts.reload_assets()
+            self.accounts.split_assets_and_save_csv(affected)
+
+            self.assertIn(nexty_id, affected)
+            self.assertFalse(os.path.exists(nexty_id + '.csv'))
+        finally:
+            os.chdir(cwd)
+
+    def test_new_assets_export(self):
+        assets_df = pd.read_csv(self.assets_file)
+        assets_df = assets_df[assets_df['Id'] != '02i1U000000OFDfQAO']
+        assets_df.to_csv(self.assets_file, index=False)
+
+        self.assertEqual([], self.watcher.poll_once(now=0))
+        self.assertEqual([self.assets_file], self.watcher.poll_once(now=2))
+        self.assertEqual(11, len(self.accounts.get_all_assets_by_distributor('0011U000008Dh2dQAC')))
+
+    def test_returned_file(self):
+        returned_file = os.path.join(self.returns, 'real_data_A_changed.csv')
+        shutil.copy('test/real_data/real_data_A_changed.csv', returned_file)
+        self.watcher.poll_once(now=0)
+        self.watcher.poll_once(now=2)
+
+        self.assertEqual([returned_file], list(self.combined_files.get_files.keys()))
+        self.assertEqual(len(self.combined_files.get_files[returned_file]), len(self.combined_files.get_combined_list))
+
+    def test_failed_file_does_not_stop_the_scan(self):
+        good_file = os.path.join(self.returns, 'real_data_A_changed.csv')
+        _write(os.path.join(self.returns, 'empty.csv'), 'Id,AccountId\n')
+        shutil.copy('test/real_data/real_data_A_changed.csv', good_file)
+        self.watcher.poll_once(now=0)
+
+        self.assertEqual([good_file], self.watcher.poll_once(now=2))
+        self.assertEqual([good_file], list(self.combined_files.get_files.keys()))
+
+    def test_new_combined_original_export(self):
+        original_file = os.path.join(self.resources, 'real_data_combined.csv')
+        shutil.copy('test/real_data/real_data_combined.csv', original_file)
+        combined_files = CombinedFiles(self.accounts_file, original_file)
+        watcher = InventoryWatcher(self.accounts, combined_files, self.resources, self.returns, settle_time=1.0,
+                                   save_splits=False)
+        returned_files = ['real_data_A_changed.csv', 'real_data_B_changed.csv']
+        for returned_file in returned_files:
+            shutil.copy(os.path.join('test/real_data', returned_file), os.path.join(self.returns, returned_file))
+        watcher.poll_once(now=0)
+        watcher.poll_once(now=2)
+        self.assertEqual(2, combined_files.get_inventory_change_number())
+
+        # the new export already holds the changes the distributors returned
+        returned_df = [pd.read_csv(os.path.join('test/real_data', name), dtype=str) for name in returned_files]
+        pd.concat(returned_df).to_csv(original_file, index=False)
+        watcher.poll_once(now=3)
+
+        self.assertEqual([original_file], watcher.poll_once(now=5))
+        self.assertEqual(0, combined_files.get_inventory_change_number())
+
+    def test_combine_recorded_to_history(self):
+        with ChangeHistory(':memory:') as history:
+            watcher = InventoryWatcher(self.accounts, self.combined_files, self.resources, self.returns,
+                                       settle_time=1.0, save_splits=False, history=history)
+            shutil.copy('test/real_data/real_data_A_changed.csv', self.returns)
+            watcher.poll_once(now=0)
+            watcher.poll_once(now=2)
+            self.assertEqual([], history.get_runs())
+
+            # the second distributor completes the returns
+            shutil.copy('test/real_data/real_data_B_changed.csv', self.returns)
+            watcher.poll_once(now=3)
+            watcher.poll_once(now=5)
+            self.assertEqual(1, len(history.get_runs()))
+            self.assertEqual(['02i1U000003m9emQAA'],
+                             [sale['asset_id'] for sale in history.get_sales_by_distributor('0011U000007zcnLQAQ')])
@@ -0,0 +1,217 @@
+import abc
+import csv
+import io
+import os
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+This script splits the combined distributor changes into size-limited batches and sends them through a sink.
+The default limits follow the Salesforce Bulk API (10,000 records or 10 MB per batch). Every batch repeats the header
+row so it can be uploaded on its own.
+"""
+
+BULK_API_MAX_ROWS = 10000
+BULK_API_MAX_BYTES = 10 * 1024 * 1024
+
+
+def _csv_line(row: typing.Sequence) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(row)
+    return buffer.getvalue()
+
+
+def iter_csv_batches(header: typing.Sequence, rows: typing.Iterable[typing.Sequence],
+                     max_rows: int = BULK_API_MAX_ROWS,
+                     max_bytes: int = BULK_API_MAX_BYTES) -> typing.Iterator[typing.List[typing.Sequence]]:
+    """
+    Splits rows into batches that stay under the row and byte limits once written as CSV with the header on top.
+    Rows are consumed lazily, so only one batch is held in memory at a time.
+    :param header: the column names row repeated at the top of every batch
+    :param rows: the data rows (without the header) to split
+    :param max_rows: the maximum number of data rows in a batch
+    :param max_bytes: the maximum size in bytes of a batch written as CSV, header included
+    :return: an iterator over lists of rows, one list per batch
+    """
+    if max_rows < 1:
+        raise Exception("Batch row limit must be at least 1.")
+
+    header_size = len(_csv_line(header).encode('utf-8'))
+    batch = []
+    batch_size = header_size
+    for row in rows:
+        row_size = len(_csv_line(row).encode('utf-8'))
+        if header_size + row_size > max_bytes:
+            raise Exception("Row is larger than the batch byte limit.")
+
+        if batch and (len(batch) >= max_rows or batch_size + row_size > max_bytes):
+            yield batch
+            batch = []
+            batch_size = header_size
+
+        batch.append(row)
+        batch_size += row_size
+
+    if batch:
+        yield batch
+
+
+def batch_to_csv(header: typing.Sequence, batch: typing.List[typing.Sequence]) -> str:
+    """
+    Writes a batch, with the header on top, as CSV text.
+    :param header: the column names row
+    :param batch: the data rows of the batch
+    :return: the batch as a CSV string
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    writer.writerows(batch)
+    return buffer.getvalue()
+
+
+class BatchResult:
+    """
+    Outcome of sending one batch through a sink.
+    """
+    def __init__(self, batch_number: int, row_count: int, byte_count: int, attempts: int, success: bool,
+                 location: str = '', error: str = ''):
+        """
+        Constructor for the BatchResult class.
+        :param batch_number: the position of the batch in the upload, starting at 0
+        :param row_count: the number of data rows in the batch
+        :param byte_count: the size of the batch in bytes as sent to the sink
+        :param attempts: how many times the batch was sent
+        :param success: whether the batch was accepted by the sink
+        :param location: where the sink stored the batch (file path, job id, etc.)
+        :param error: the last error message if the batch failed
+        """
+        self.batch_number = batch_number
+        self.row_count = row_count
+        self.byte_count = byte_count
+        self.attempts = attempts
+        self.success = success
+        self.location = location
+        self.error = error
+
+    def __repr__(self) -> str:
+        return 'BatchResult(batch_number={}, row_count={}, success={}, attempts={})'.format(
+            self.batch_number, self.row_count, self.success, self.attempts)
+
+
+class BatchSink(abc.ABC):
+    """
+    Interface for the destination of the batches. Subclasses must implement send_batch, which may be called from
+    several threads at once.
+    """
+    @abc.abstractmethod
+    def send_batch(self, batch_number: int, csv_data: str) -> str:
+        """
+        Sends one batch to the destination.
+        :param batch_number: the position of the batch in the upload, starting at 0
+        :param csv_data: the batch, header included, as a CSV string
+        :return: a string describing where the batch was stored; raise an exception if the batch was not accepted
+        """
+
+
+class LocalFileSink(BatchSink):
+    """
+    Sink that writes each batch to its own CSV file in a directory. Useful for testing and for uploading the batches
+    by hand with Dataloader.io.
+    """
+    def __init__(self, directory: str, file_prefix: str = 'combined_file'):
+        """
+        Constructor for the LocalFileSink class.
+        :param directory: the directory the batch files are written to (created if missing)
+        :param file_prefix: the start of every batch file name
+        """
+        self._directory = directory
+        self._file_prefix = file_prefix
+        os.makedirs(directory, exist_ok=True)
+
+    def send_batch(self, batch_number: int, csv_data: str) -> str:
+        file_name = os.path.join(self._directory, '{}_batch{:04d}.csv'.format(self._file_prefix, batch_number))
+        with open(file_name, 'w', newline='', encoding='utf-8') as f:
+            f.write(csv_data)
+
+        return file_name
+
+
+class BatchUploader:
+    """
+    Splits rows into batches and sends them through a sink with a bounded number of concurrent uploads.
+    Failed batches are retried with an exponential back off; every batch gets a BatchResult.
+    """
+    def __init__(self, sink: BatchSink, max_rows: int = BULK_API_MAX_ROWS, max_bytes: int = BULK_API_MAX_BYTES,
+                 max_workers: int = 4, max_retries: int = 3, retry_delay: float = 1.0):
+        """
+        Constructor for the BatchUploader class.
+        :param sink: the sink the batches are sent through
+        :param max_rows: the maximum number of data rows in a batch
+        :param max_bytes: the maximum size in bytes of a batch, header included
+        :param max_workers: the maximum number of batches being sent at the same time
+        :param max_retries: how many times a failed batch is sent again before giving up
+        :param retry_delay: seconds to wait before the first retry, doubled on every following retry
+        """
+        if max_workers < 1:
+            raise Exception("Uploader needs at least one worker.")
+
+        self._sink = sink
+        self._max_rows = max_rows
+        self._max_bytes = max_bytes
+        self._max_workers = max_workers
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+
+    def _send(self, batch_number: int, header: typing.Sequence, batch: typing.List[typing.Sequence]) -> BatchResult:
+        csv_data = batch_to_csv(header, batch)
+        byte_count = len(csv_data.encode('utf-8'))
+        error = ''
+        for attempt in range(1, self._max_retries + 2):
+            try:
+                location = self._sink.send_batch(batch_number, csv_data)
+                return BatchResult(batch_number, len(batch), byte_count, attempt, True, location=location)
+            except Exception as e:
+                error = str(e)
+                if attempt <= self._max_retries:
+                    time.sleep(self._retry_delay * 2 ** (attempt - 1))
+
+        return BatchResult(batch_number, len(batch), byte_count, self._max_retries + 1, False, error=error)
+
+    def upload(self, rows: typing.List[typing.Sequence]) -> typing.List[BatchResult]:
+        """
+        Uploads rows, header first, in batches.
+        At most max_workers batches are built and in flight at a time, so memory stays bounded by the batch size.
+        Every row is checked against the byte limit before the first batch is sent, so a row that can never be uploaded
+        stops the upload before anything reaches the sink.
+        :param rows: the header row followed by the data rows (the format of CombinedFiles.get_combined_list)
+        :return: a list of BatchResult ordered by batch number
+        """
+        if len(rows) < 2:
+            print("Nothing to upload.")
+            return []
+
+        header = rows[0]
+        header_size = len(_csv_line(header).encode('utf-8'))
+        oversized = [number for number, row in enumerate(rows[1:], start=1)
+                     if header_size + len(_csv_line(row).encode('utf-8')) > self._max_bytes]
+        if oversized:
+            raise Exception("Rows {} are larger than the batch byte limit, nothing was uploaded.".format(oversized))
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            pending = []
+            batches = iter_csv_batches(header, rows[1:], self._max_rows, self._max_bytes)
+            for batch_number, batch in enumerate(batches):
+                if len(pending) >= self._max_workers:
+                    results.append(pending.pop(0).result())
+                pending.append(executor.submit(self._send, batch_number, header, batch))
+
+            results.extend(future.result() for future in pending)
+
+        failed = [result.batch_number for result in results if not result.success]
+        if failed:
+            print('Batches', failed, 'failed to upload.')
+
+        return results
@@ -18,12 +18,17 @@ import signal
 import re
 import sys
 import csv
+import os
+
+# csv_engine lives next to accounts_parser, one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from csv_engine import AUTO, read_csv_frame
 
 class Assets():
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, engine: str = AUTO):
         f_dataframe = []
         try:
-            f_dataframe = pd.read_csv(file_name)
+            f_dataframe = read_csv_frame(file_name, engine)
         except IOError:
             raise Exception("Assets file not found.")
 
@@ -32,10 +37,10 @@ class Assets():
         self.f = np.vstack((f_header, self.f))
 
 class Accounts():
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, engine: str = AUTO):
         self.f_dataframe = []
         try:
-            self.f_dataframe = pd.read_csv(file_name)
+            self.f_dataframe = read_csv_frame(file_name, engine)
         except IOError:
             raise Exception("Accounts file not found.")
 
@@ -0,0 +1,241 @@
+import argparse
+import fnmatch
+import os
+import threading
+import time
+import typing
+from accounts_parser import AccountsAndAssets, CombinedFiles
+from change_history import ChangeHistory
+
+"""
+This script watches the resources and returns directories and reprocesses the files as they are dropped.
+A new assets export is parsed again in full (the accounts stay loaded) and only the distributors whose assets changed
+are split again. A new accounts export reloads and splits everything. A new original export of the combined files
+reloads them, and the returned files are diffed against it. A file returned by a distributor replaces that file in the
+combined files, which are then all combined and diffed again; once every distributor returned its file, each combine is
+recorded to the change history.
+The directories are polled: a file is only processed once its size and modification time stopped changing for the
+settle time, so files that are still being written or copied are never read half way.
+"""
+
+
+class DirectoryWatcher:
+    """
+    Polls a directory and reports the files that were created or modified once they stopped changing.
+    """
+    def __init__(self, directory: str, pattern: str = '*.csv', settle_time: float = 1.0):
+        """
+        Constructor for the DirectoryWatcher class.
+        :param directory: the directory to watch
+        :param pattern: the file name pattern of the files to report
+        :param settle_time: seconds a file must stay unchanged before it is reported
+        """
+        self._directory = directory
+        self._pattern = pattern
+        self._settle_time = settle_time
+        self._pending = {}  # file name -> (signature, time the signature was first seen)
+        self._reported = {}  # file name -> signature when it was last reported
+
+    def mark_seen(self):
+        """
+        Marks the files already in the directory as reported, so only files written afterwards are reported.
+        :return: None
+        """
+        self._reported.update(self._scan())
+
+    def _scan(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        if not os.path.isdir(self._directory):
+            return {}
+
+        signatures = {}
+        with os.scandir(self._directory) as entries:
+            for entry in entries:
+                if entry.is_file() and fnmatch.fnmatch(entry.name, self._pattern):
+                    stat = entry.stat()
+                    signatures[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+        return signatures
+
+    def poll(self, now: float = None) -> typing.List[str]:
+        """
+        Scans the directory once.
+        :param now: the current time in seconds, time.monotonic() if not given
+        :return: a sorted list of the file names that changed and have been stable for the settle time
+        """
+        now = time.monotonic() if now is None else now
+        signatures = self._scan()
+        ready = []
+        for file_name, signature in signatures.items():
+            if self._reported.get(file_name) == signature:
+                self._pending.pop(file_name, None)
+                continue
+
+            pending = self._pending.get(file_name)
+            if pending is None or pending[0] != signature:
+                self._pending[file_name] = (signature, now)
+            elif now - pending[1] >= self._settle_time:
+                del self._pending[file_name]
+                self._reported[file_name] = signature
+                ready.append(file_name)
+
+        for file_name in set(self._pending) - set(signatures):
+            del self._pending[file_name]
+
+        return sorted(ready)
+
+
+class InventoryWatcher:
+    """
+    Long running watch mode: applies every new export or returned distributor file to the loaded data.
+    """
+    def __init__(self, accounts_and_assets: AccountsAndAssets, combined_files: CombinedFiles = None,
+                 resources_directory: str = 'resources', returns_directory: str = 'returns',
+                 poll_interval: float = 1.0, settle_time: float = 1.0, save_splits: bool = True,
+                 history: ChangeHistory = None):
+        """
+        Constructor for the InventoryWatcher class.
+        :param accounts_and_assets: the loaded exports; its accounts and assets files are the ones watched in the
+        resources directory
+        :param combined_files: the CombinedFiles the returned distributor files are added to, returns are not watched
+        if None
+        :param resources_directory: the directory the Dataloader.io exports are dropped into
+        :param returns_directory: the directory the files returned by the distributors are dropped into
+        :param poll_interval: seconds between two scans of the directories
+        :param settle_time: seconds a file must stay unchanged before it is processed
+        :param save_splits: whether the distributor files are written again after an assets export changes
+        :param history: the change history every combine is recorded to once all the distributors returned their
+        files, nothing is recorded if None
+        """
+        self._accounts_and_assets = accounts_and_assets
+        self._combined_files = combined_files
+        self._poll_interval = poll_interval
+        self._save_splits = save_splits
+        self._history = history
+        self._resources_watcher = DirectoryWatcher(resources_directory, settle_time=settle_time)
+        self._returns_watcher = DirectoryWatcher(returns_directory, settle_time=settle_time)
+        self._resources_watcher.mark_seen()
+        self._returns_watcher.mark_seen()
+
+    def _is_export(self, file_name: str, export_file_name: str) -> bool:
+        return os.path.exists(export_file_name) and os.path.samefile(file_name, export_file_name)
+
+    def process_export(self, file_name: str) -> typing.List[str]:
+        """
+        Applies a new accounts or assets export and splits again the distributors it affects. When the file is also
+        an original export of the combined files, they are reloaded and the returned files are diffed against it.
+        :param file_name: the export file that changed
+        :return: the ids of the distributors whose assets were split again
+        """
+        combined_original = False
+        if self._combined_files is not None:
+            original = self._combined_files.get_original_accounts_and_assets
+            combined_original = (self._is_export(file_name, original.get_accounts_file_name) or
+                                 self._is_export(file_name, original.get_assets_file_name))
+            if combined_original:
+                self._combined_files.reload()
+                self._record_changes()
+
+        if self._is_export(file_name, self._accounts_and_assets.get_accounts_file_name):
+            self._accounts_and_assets.reload()
+            affected = None
+        elif self._is_export(file_name, self._accounts_and_assets.get_assets_file_name):
+            affected = self._accounts_and_assets.reload_assets()
+            if not affected:
+                print('Assets export [', file_name, '] has no changes.')
+                return []
+        else:
+            if not combined_original:
+                print('File [', file_name, '] is not the accounts or assets export, ignored.')
+            return []
+
+        if self._save_splits:
+            splits = self._accounts_and_assets.split_assets_and_save_csv(affected)
+        else:
+            splits = self._accounts_and_assets.split_assets_by_distributor(affected)
+
+        return list(splits.keys())
+
+    def _record_changes(self):
+        if self._history is None or not self._combined_files.get_files:
+            return
+        if not self._combined_files.is_complete():
+            print('Changes not recorded until every distributor returned its file.')
+            return
+
+        self._combined_files.record_changes(self._history)
+
+    def process_return(self, file_name: str) -> typing.List[typing.List[typing.List[str]]]:
+        """
+        Adds (or replaces) a file returned by a distributor, then combines and diffs the returned files again.
+        :param file_name: the returned file
+        :return: the changes found, as returned by CombinedFiles.show_changes
+        """
+        files = self._combined_files.get_files
+        previous = files.get(file_name)
+        try:
+            self._combined_files.add_file(file_name)
+            self._combined_files.combine_files()
+        except Exception:
+            # a file that cannot be combined is taken out again so it does not break the next returns
+            if previous is None:
+                files.pop(file_name, None)
+            else:
+                files[file_name] = previous
+            raise
+
+        changes = self._combined_files.show_changes()
+        self._record_changes()
+        return changes
+
+    def poll_once(self, now: float = None) -> typing.List[str]:
+        """
+        Scans the watched directories once and processes the files that are ready.
+        A file that fails to process is reported and skipped without stopping the others; it is processed again when
+        it changes.
+        :param now: the current time in seconds, time.monotonic() if not given
+        :return: the list of the file names processed successfully
+        """
+        ready = [(file_name, self.process_export) for file_name in self._resources_watcher.poll(now)]
+        if self._combined_files is not None:
+            ready += [(file_name, self.process_return) for file_name in self._returns_watcher.poll(now)]
+
+        processed = []
+        for file_name, process in ready:
+            try:
+                process(file_name)
+                processed.append(file_name)
+            except Exception as e:
+                print('Failed to process [', file_name, ']:', e)
+
+        return processed
+
+    def run(self, stop_event: threading.Event = None):
+        """
+        Polls the directories until the stop event is set (or forever).
+        :param stop_event: event used to stop the watch from another thread
+        :return: None
+        """
+        stop_event = threading.Event() if stop_event is None else stop_event
+        while not stop_event.is_set():
+            try:
+                for file_name in self.poll_once():
+                    print('Processed [', file_name, ']')
+            except Exception as e:
+                print('Failed to scan for new files:', e)
+            stop_event.wait(self._poll_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reprocess the exports and distributor returns as they are dropped.')
+    parser.add_argument('accounts_file_name', help='the accounts export in the resources directory')
+    parser.add_argument('assets_file_name', help='the assets export in the resources directory')
+    parser.add_argument('--returns', default='returns', help='the directory the distributor files are returned to')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between two scans')
+    parser.add_argument('--history', default='change_history.db', help='the change history database')
+    args = parser.parse_args()
+
+    accounts_and_assets = AccountsAndAssets(args.accounts_file_name, args.assets_file_name)
+    with ChangeHistory(args.history) as change_history:
+        InventoryWatcher(accounts_and_assets, CombinedFiles(args.accounts_file_name, args.assets_file_name),
+                         os.path.dirname(os.path.abspath(args.assets_file_name)), args.returns,
+                         poll_interval=args.interval, history=change_history).run()